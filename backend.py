@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+"""Backend residente: o serviço responde as listagens por um socket local
+(127.0.0.1, porta aleatória) e o plugin só monta os ListItems. O endereço e o
+token de acesso ficam em backend.json, no perfil do addon.
+
+Protocolo: uma conexão por pedido; o cliente envia uma linha JSON e recebe
+uma linha de aceite ({"accepted": true}) assim que o backend começa a rota,
+depois a linha JSON de resposta. As rotas rodam uma por vez, sempre na mesma
+thread (as conexões SQLite do main ficam na thread que as abriu): se outra não
+terminar em QUEUE_TIMEOUT, o backend responde "ocupado" e o plugin executa a
+rota no próprio processo, em vez de esperar na fila."""
+import hmac
+import json
+import os
+import queue
+import secrets
+import socket
+import threading
+
+BACKEND_FILE = 'backend.json'
+CONNECT_TIMEOUT = 0.5
+QUEUE_TIMEOUT = 1  # espera por uma rota em andamento antes de devolver "ocupado"
+ACCEPT_TIMEOUT = QUEUE_TIMEOUT + 1  # sem aceite nesse prazo, o plugin desiste
+REQUEST_TIMEOUT = 120  # a primeira listagem de uma categoria pode ir ao servidor
+READ_TIMEOUT = 5  # tempo para o cliente mandar o pedido depois de conectar
+
+
+def _read_line(f):
+    line = f.readline()
+    if not line.endswith(b'\n'):
+        raise ValueError('resposta incompleta')
+    return json.loads(line.decode('utf-8'))
+
+
+def _write_line(sock, data):
+    sock.sendall(json.dumps(data).encode('utf-8') + b'\n')
+
+
+def request(profile_dir, payload, timeout=REQUEST_TIMEOUT):
+    """Envia `payload` ao backend e devolve a resposta (dict), ou None se o
+    backend não estiver rodando ou falhar; o plugin então executa a rota no
+    próprio processo."""
+    try:
+        with open(os.path.join(profile_dir, BACKEND_FILE), 'r', encoding='utf-8') as f:
+            info = json.load(f)
+        sock = socket.create_connection(('127.0.0.1', int(info['port'])), timeout=CONNECT_TIMEOUT)
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+    try:
+        sock.settimeout(ACCEPT_TIMEOUT)
+        _write_line(sock, dict(payload, token=info.get('token', '')))
+        with sock.makefile('rb') as f:
+            reply = _read_line(f)
+            if isinstance(reply, dict) and reply.get('accepted'):
+                sock.settimeout(timeout)
+                reply = _read_line(f)
+        return reply if isinstance(reply, dict) else None
+    except (OSError, ValueError):
+        return None
+    finally:
+        sock.close()
+
+
+def start(profile_dir, handler, log=None):
+    """Abre o socket, publica backend.json e atende cada conexão numa thread;
+    as rotas rodam uma por vez numa única thread (usam o estado global do main).
+    `handler(pedido)` devolve o dict de resposta. Retorna o Event que encerra o
+    backend."""
+    token = secrets.token_hex(16)
+    server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_socket.bind(('127.0.0.1', 0))
+    server_socket.listen(8)
+    server_socket.settimeout(1)
+    port = server_socket.getsockname()[1]
+
+    path = os.path.join(profile_dir, BACKEND_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'port': port, 'token': token, 'pid': os.getpid()}, f)
+    os.replace(tmp_path, path)
+    stop_event = threading.Event()
+    route_lock = threading.Lock()
+    routes = queue.Queue()
+
+    def run_routes():
+        while True:
+            job = routes.get()
+            if job is None:
+                return
+            try:
+                job['reply'] = handler(job['request'])
+            except Exception as e:
+                job['reply'] = {'ok': False, 'error': str(e)}
+            job['done'].set()
+
+    def serve(client_socket):
+        client_socket.settimeout(READ_TIMEOUT)
+        with client_socket.makefile('rb') as f:
+            req = _read_line(f)
+        if not isinstance(req, dict) or not hmac.compare_digest(str(req.get('token', '')), token):
+            _write_line(client_socket, {'ok': False, 'error': 'token inválido'})
+            return
+        if not route_lock.acquire(timeout=QUEUE_TIMEOUT):
+            _write_line(client_socket, {'ok': False, 'error': 'ocupado'})
+            return
+        try:
+            _write_line(client_socket, {'accepted': True})
+            client_socket.settimeout(REQUEST_TIMEOUT)
+            job = {'request': req, 'done': threading.Event()}
+            routes.put(job)
+            job['done'].wait()
+        finally:
+            route_lock.release()
+        _write_line(client_socket, job['reply'])
+
+    def serve_client(client_socket):
+        try:
+            serve(client_socket)
+        except (OSError, ValueError) as e:
+            if log:
+                log(f"Backend: pedido descartado: {e}")
+        finally:
+            client_socket.close()
+
+    def run_server():
+        if log:
+            log(f"Backend: ouvindo em 127.0.0.1:{port}")
+        try:
+            while not stop_event.is_set():
+                try:
+                    client_socket, _ = server_socket.accept()
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+                threading.Thread(target=serve_client, args=(client_socket,)).start()
+        finally:
+            server_socket.close()
+            routes.put(None)
+            # só remove o arquivo se ainda for deste backend
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    if json.load(f).get('token') == token:
+                        os.remove(path)
+            except (OSError, ValueError):
+                pass
+            if log:
+                log("Backend: finalizado")
+
+    threading.Thread(target=run_routes, name='xtreamtotal-backend-routes').start()
+    threading.Thread(target=run_server, name='xtreamtotal-backend').start()
+    return stop_event
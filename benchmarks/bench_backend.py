@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+"""Benchmark e verificação do backend residente, offline: sobe um servidor
+Xtream falso (categorias, canais e o XMLTV de xmltv_gen), baixa o guia, inicia
+o backend do serviço neste processo e pede N listagens de canais com EPG pelo
+mesmo caminho do plugin (backend_listing -> backend.request). A cada
+--rewrite pedidos o epg.db é "trocado" (mtime novo), como faz o serviço.
+
+Falha (código 1) se algum pedido não for atendido pelo backend ou vier sem o
+programa atual nos canais. Mede o tempo por pedido (p50/p95).
+
+Uso:
+    python benchmarks/bench_backend.py --requests 20 --channels 300
+"""
+import argparse
+import http.server
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from bench_epg import load_main  # noqa: E402
+from xmltv_gen import channel_id, generate_xmltv  # noqa: E402
+
+CATEGORIES = 4
+
+
+def xtream_server(xml_path, channels):
+    with open(xml_path, 'rb') as f:
+        guide = f.read()
+    streams = [{'num': i, 'name': f'Canal {i} HD', 'stream_type': 'live', 'stream_id': i, 'stream_icon': None,
+                'epg_channel_id': channel_id(i), 'category_id': str(i % CATEGORIES)} for i in range(channels)]
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            url = urllib.parse.urlparse(self.path)
+            query = dict(urllib.parse.parse_qsl(url.query))
+            action = query.get('action')
+            if url.path == '/xmltv.php':
+                body, content_type = guide, 'application/xml'
+            elif action == 'get_live_categories':
+                body = json.dumps([{'category_id': str(i), 'category_name': f'Categoria {i}', 'parent_id': 0}
+                                   for i in range(CATEGORIES)]).encode('utf-8')
+                content_type = 'application/json'
+            elif action == 'get_live_streams':
+                cid = query.get('category_id')
+                body = json.dumps([s for s in streams if cid is None or s['category_id'] == cid]).encode('utf-8')
+                content_type = 'application/json'
+            else:
+                body = json.dumps({'user_info': {'auth': 1, 'status': 'Active'}, 'server_info': {}}).encode('utf-8')
+                content_type = 'application/json'
+            self.send_response(200)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[max(0, int(round(len(values) * pct / 100.0)) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Backend residente: listagens de canais com EPG.')
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--channels', type=int, default=300)
+    parser.add_argument('--days', type=int, default=2)
+    parser.add_argument('--rewrite', type=int, default=5, help='troca o epg.db a cada N pedidos (0: nunca)')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='xtreamtotal-bench-')
+    server = None
+    stop = None
+    try:
+        xml_path = os.path.join(workdir, 'guide.xml')
+        generate_xmltv(xml_path, channels=args.channels, days=args.days)
+        server = xtream_server(xml_path, args.channels)
+        profile = os.path.join(workdir, 'profile')
+        os.makedirs(profile)
+        addon = load_main(profile, {'host': f'http://127.0.0.1:{server.server_address[1]}', 'username': 'u',
+                                    'password': 'p', 'enable_epg': 'true', 'epg_mode': '0',
+                                    'service_backend': 'true', 'page_size': '0'})
+        import backend
+        import service
+        addon.epg_download()
+        stop = backend.start(addon.PROFILE_DIR, service.backend_handle)
+
+        times = []
+        failures = 0
+        for i in range(args.requests):
+            if args.rewrite and i and i % args.rewrite == 0:
+                now = time.time()
+                os.utime(addon.EPG_DB_PATH, (now, now + i))
+            addon.PARAMS = {'category_id': str(i % CATEGORIES)}
+            started = time.perf_counter()
+            reply = addon.backend_listing('live_items')
+            times.append(time.perf_counter() - started)
+            if reply is None or not any('Agora:' in (item.get('plot') or '') for item in reply[0]):
+                failures += 1
+                print(f'pedido {i}: ' + ('sem resposta do backend' if reply is None else 'canais sem EPG'))
+
+        print(f'{"pedidos":>7} {"falhas":>6} {"p50":>8} {"p95":>8}')
+        print(f'{len(times):>7} {failures:>6} {percentile(times, 50) * 1000:>6.1f}ms '
+              f'{percentile(times, 95) * 1000:>6.1f}ms')
+        if failures:
+            raise SystemExit(1)
+    finally:
+        if stop is not None:
+            stop.set()
+            time.sleep(1.2)
+        if server is not None:
+            server.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""Benchmark do EPG, offline: gera um XMLTV sintético, serve-o por um HTTP
+local e mede, cada fase num processo novo (como o Kodi faz a cada listagem),
+o tempo e o pico de memória (RSS) de:
+
+  download_index   epg_download(): download + recorte + índice SQLite
+  index_load       abrir o índice (ensure_epg_loaded)
+  annotate_N       annotate_live_with_epg() numa categoria de N canais
+  fallback_parse   epg_load_parsed(): guia em memória sem o índice
+
+Com --parse-compare, mais duas fases sobre o guia gerado inteiro (sem o
+recorte da janela de retenção), comparando o parsing:
+
+  etree_parse      ET.parse + findall + dicts (o epg_load_parsed anterior)
+  iterparse        epg_iter_xmltv(): iterparse liberando cada elemento
+
+Requer `requests`; os módulos do Kodi vêm de benchmarks/kodistubs.
+
+Uso:
+    python benchmarks/bench_epg.py --channels 1200 --days 10 --sizes 50,200,1000
+    python benchmarks/bench_epg.py --channels 1200 --days 10 --parse-compare
+"""
+import argparse
+import gzip
+import http.server
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+sys.path.insert(0, HERE)
+
+from xmltv_gen import channel_id, generate_xmltv  # noqa: E402
+
+
+def peak_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KB, macOS em bytes
+    return rss / (1024.0 * 1024.0) if sys.platform == 'darwin' else rss / 1024.0
+
+
+def load_main(profile, settings):
+    """Importa main.py com os stubs do Kodi, o perfil e as configurações dados."""
+    os.environ['XT_PROFILE'] = profile
+    os.environ['XT_SETTINGS'] = json.dumps(settings)
+    sys.path[:0] = [os.path.join(HERE, 'kodistubs'), ROOT]
+    sys.argv = ['plugin://plugin.video.xtreamtotal/', '-1', '']
+    import main
+    return main
+
+
+def fake_items(count, channels):
+    return [{'title': f'Canal {i} HD', 'url': f'http://127.0.0.1/live/u/p/{i}.m3u8', 'icon': '',
+             'epg_channel_id': channel_id(i % channels), 'stream_id': i} for i in range(count)]
+
+
+def run_phase(args):
+    """Executa uma fase no processo atual e imprime o resultado em JSON."""
+    settings = json.loads(args.settings)
+    started = time.perf_counter()
+    main = load_main(args.profile, settings)
+    result = {'phase': args.phase, 'import_s': time.perf_counter() - started}
+
+    started = time.perf_counter()
+    if args.phase == 'download_index':
+        main.epg_download()
+        db = main.sqlite3.connect(main.EPG_DB_PATH)
+        result['programmes'] = db.execute('SELECT COUNT(*) FROM programmes').fetchone()[0]
+        db.close()
+        result['db_mb'] = os.path.getsize(main.EPG_DB_PATH) / 1048576.0
+        result['guide_mb'] = os.path.getsize(main.EPG_XML_PATH) / 1048576.0
+    elif args.phase == 'index_load':
+        main.ensure_epg_loaded()
+    elif args.phase.startswith('annotate_'):
+        size = int(args.phase.split('_', 1)[1])
+        items = fake_items(size, args.channels)
+        main.ensure_epg_loaded()
+        result['load_s'] = time.perf_counter() - started
+        started = time.perf_counter()
+        out = main.annotate_live_with_epg(items)
+        result['with_epg'] = sum(1 for i in out if i.get('plot'))
+    elif args.phase == 'fallback_parse':
+        epg = main.epg_load_parsed()
+        result['load_s'] = time.perf_counter() - started
+        started = time.perf_counter()
+        main.epg_lookup_many([channel_id(i) for i in range(args.channels)], epg)
+    elif args.phase == 'etree_parse':
+        # o epg_load_parsed() anterior ao iterparse: árvore inteira em memória
+        root = main.lazy_import('xml.etree.ElementTree').parse(args.xml).getroot()
+        channels = {}
+        progs = {}
+        for c in root.findall('.//channel'):
+            channels[main.normalize_epg_channel_id(c.get('id'))] = (c.findtext('display-name') or '').strip()
+        for p in root.findall('.//programme'):
+            cid = main.normalize_epg_channel_id(p.get('channel'))
+            try:
+                start = int(p.get('start_timestamp'))
+            except (TypeError, ValueError):
+                start = main.parse_xmltv_time(p.get('start'))
+            try:
+                stop = int(p.get('stop_timestamp') or p.get('end_timestamp'))
+            except (TypeError, ValueError):
+                stop = main.parse_xmltv_time(p.get('stop') or p.get('end'))
+            if stop <= start:
+                stop = start + 3600
+            progs.setdefault(cid, []).append({'start': start, 'end': stop,
+                                              'title': (p.findtext('title') or '').strip(),
+                                              'desc': (p.findtext('desc') or '').strip()})
+        result['programmes'] = sum(len(v) for v in progs.values())
+    elif args.phase == 'iterparse':
+        with main.epg_open_xml(args.xml) as source:
+            result['programmes'] = sum(1 for entry in main.epg_iter_xmltv(source) if entry[0] == 'programme')
+    else:
+        raise SystemExit(f'fase desconhecida: {args.phase}')
+    result['seconds'] = time.perf_counter() - started
+    result['peak_rss_mb'] = peak_rss_mb()
+    print(json.dumps(result))
+
+
+def serve_file(path):
+    """HTTP local que responde /xmltv.php com o arquivo (gzip se pedido). Roda
+    num processo separado: o pico de RSS é herdado pelos filhos via exec, e
+    o arquivo servido fica todo em memória."""
+    with open(path, 'rb') as f:
+        raw = f.read()
+    compressed = gzip.compress(raw, 6)
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if not self.path.startswith('/xmltv.php'):
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            use_gzip = 'gzip' in (self.headers.get('Accept-Encoding') or '')
+            body = compressed if use_gzip else raw
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/xml')
+            if use_gzip:
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    print(server.server_address[1], flush=True)
+    server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do EPG (offline).')
+    parser.add_argument('--channels', type=int, default=600)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--desc-words', type=int, default=40)
+    parser.add_argument('--timestamps', choices=('xmltv', 'unix', 'mixed'), default='mixed')
+    parser.add_argument('--sizes', default='50,200,1000', help='tamanhos de categoria para annotate')
+    parser.add_argument('--past-hours', type=int, default=6)
+    parser.add_argument('--future-hours', type=int, default=48)
+    parser.add_argument('--parse-compare', action='store_true',
+                        help='compara ET.parse com o iterparse no guia inteiro')
+    parser.add_argument('--keep', action='store_true', help='não apaga o diretório de trabalho')
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    parser.add_argument('--phase', help=argparse.SUPPRESS)
+    parser.add_argument('--profile', help=argparse.SUPPRESS)
+    parser.add_argument('--settings', help=argparse.SUPPRESS)
+    parser.add_argument('--xml', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.serve:
+        serve_file(args.serve)
+        return
+    if args.phase:
+        run_phase(args)
+        return
+
+    workdir = tempfile.mkdtemp(prefix='xtreamtotal-bench-')
+    try:
+        xml_path = os.path.join(workdir, 'guide.xml')
+        started = time.perf_counter()
+        total = generate_xmltv(xml_path, args.channels, args.days, args.desc_words, args.timestamps)
+        print(f'XMLTV: {args.channels} canais, {total} programas, '
+              f'{os.path.getsize(xml_path) / 1048576.0:.1f} MB (gerado em {time.perf_counter() - started:.1f}s)')
+
+        server = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', xml_path],
+                                  stdout=subprocess.PIPE, text=True)
+        port = int(server.stdout.readline())
+        profile = os.path.join(workdir, 'profile')
+        os.makedirs(profile)
+        settings = {
+            'host': f'http://127.0.0.1:{port}',
+            'username': 'bench', 'password': 'bench',
+            'enable_epg': 'true', 'epg_mode': '0',
+            'epg_past_hours': str(args.past_hours), 'epg_future_hours': str(args.future_hours),
+        }
+        phases = ['download_index', 'index_load']
+        phases += [f'annotate_{int(n)}' for n in args.sizes.split(',') if n.strip()]
+        phases.append('fallback_parse')
+        if args.parse_compare:
+            phases += ['etree_parse', 'iterparse']
+
+        print(f'{"fase":<16} {"tempo":>10} {"carga":>10} {"RSS pico":>10}  extra')
+        for phase in phases:
+            cmd = [sys.executable, os.path.abspath(__file__), '--phase', phase, '--profile', profile,
+                   '--settings', json.dumps(settings), '--channels', str(args.channels), '--xml', xml_path]
+            proc = subprocess.run(cmd, capture_output=True, text=True)
+            if proc.returncode != 0:
+                print(f'{phase:<16} FALHOU\n{proc.stderr}')
+                break
+            res = json.loads(proc.stdout.strip().splitlines()[-1])
+            extra = ', '.join(f'{k}={v:.1f}' if isinstance(v, float) else f'{k}={v}'
+                              for k, v in res.items()
+                              if k not in ('phase', 'seconds', 'load_s', 'peak_rss_mb'))
+            load = f'{res["load_s"] * 1000:.1f} ms' if 'load_s' in res else '-'
+            rss = f'{res["peak_rss_mb"]:.0f} MB' if res.get('peak_rss_mb') else '-'
+            print(f'{phase:<16} {res["seconds"] * 1000:>7.1f} ms {load:>10} {rss:>10}  {extra}')
+        server.terminate()
+        server.wait()
+    finally:
+        if args.keep:
+            print(f'diretório de trabalho: {workdir}')
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
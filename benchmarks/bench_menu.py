@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+"""Benchmark do build_menu(), offline: monta N itens de cada tipo com os
+módulos do Kodi simulados (benchmarks/kodistubs) e mede o custo por item:
+
+  filmes    itens reproduzíveis (URL de play com User-Agent)
+  canais    itens reproduzíveis com programa atual/próximo na sinopse
+  series    pastas com parâmetros (series_id)
+  pesquisa  resultados "Filme: ..." (URL com título e ícone)
+
+Os stubs não têm o custo do Kodi em C++; o número medido é a parte Python
+(montagem de URLs, ListItems e chamadas à API do xbmcplugin).
+
+Uso:
+    python benchmarks/bench_menu.py --items 10000 --repeat 5
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from bench_epg import load_main  # noqa: E402
+
+
+def fake_items(kind, count):
+    if kind == 'filmes':
+        return [{'title': f'Filme Ação Número {i} (2020)', 'icon': f'http://cdn.example.com/v{i}.jpg',
+                 'url': f'http://host.example.com:8080/movie/u/p/{100000 + i}.mp4'} for i in range(count)]
+    if kind == 'canais':
+        return [{'title': f'Canal {i} HD - Jornal da Noite', 'icon': f'http://cdn.example.com/{i}.png',
+                 'url': f'http://host.example.com:8080/live/u/p/{i}.m3u8', 'stream_id': i,
+                 'plot': 'Agora: Jornal da Noite\nNotícias do dia.\n\nPróximo: Filme\nAção e aventura.'}
+                for i in range(count)]
+    if kind == 'series':
+        return [{'title': f'Série Número {i}', 'icon': f'http://cdn.example.com/s{i}.jpg',
+                 'params': f'series_id={i}'} for i in range(count)]
+    return [{'title': f'Filme: Filme Ação Número {i} (2020)', 'icon': f'http://cdn.example.com/v{i}.jpg',
+             'url': f'http://host.example.com:8080/movie/u/p/{100000 + i}.mp4', 'plot': ''} for i in range(count)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do build_menu() (offline).')
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='xtreamtotal-bench-')
+    try:
+        addon = load_main(workdir, {'host': 'http://host.example.com:8080', 'username': 'u', 'password': 'p'})
+        import xbmcplugin
+
+        calls = {'n': 0}
+
+        def counted(fn):
+            def wrapper(*a, **kw):
+                calls['n'] += 1
+                return fn(*a, **kw)
+            return wrapper
+        xbmcplugin.addDirectoryItem = counted(xbmcplugin.addDirectoryItem)
+        xbmcplugin.addDirectoryItems = counted(xbmcplugin.addDirectoryItems)
+
+        print(f'{"tipo":<10} {"itens":>7} {"total":>10} {"por item":>10} {"chamadas":>9}')
+        for kind, mode, playable in (('filmes', None, True), ('canais', None, True),
+                                     ('series', 'seasons', False), ('pesquisa', None, True)):
+            best = None
+            for _ in range(args.repeat):
+                items = fake_items(kind, args.items)
+                del xbmcplugin.ITEMS[:]
+                calls['n'] = 0
+                started = time.perf_counter()
+                addon.build_menu(items, mode, playable)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            print(f'{kind:<10} {len(xbmcplugin.ITEMS):>7} {best * 1000:>7.1f} ms '
+                  f'{best / args.items * 1e6:>7.1f} µs {calls["n"]:>9}')
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
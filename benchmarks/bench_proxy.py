@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Benchmark do proxy local, offline: sobe um servidor de origem HTTP local
+(com atraso por segmento) e, para cada motor do proxy (configuração
+proxy_engine: threads ou asyncio, cada um num processo novo), dispara N
+pedidos simultâneos e mede o tempo total, p50/p95 por pedido e o pico de
+threads do processo do proxy:
+
+  segmentos   /hlsretry de segmentos .ts de 200 KB
+  falhas      /hlsretry de segmentos que respondem 500 (espera de 3s e cache)
+
+O pico de threads vem de /proc (só Linux). Usa a porta 8097 do proxy, que
+precisa estar livre; os módulos do Kodi vêm de benchmarks/kodistubs.
+
+Uso:
+    python benchmarks/bench_proxy.py --requests 200 --delay 0.3
+"""
+import argparse
+import http.server
+import json
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+PROXY_PORT = 8097
+SEGMENT = bytes(range(256)) * 800
+ENGINES = (('threads', '0'), ('asyncio', '1'))
+
+
+def upstream_server(delay):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if '/fail/' in self.path:
+                self.send_response(500)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header('Content-Type', 'video/mp2t')
+            self.send_header('Content-Length', str(len(SEGMENT)))
+            self.end_headers()
+            self.wfile.write(SEGMENT)
+
+    class Server(http.server.ThreadingHTTPServer):
+        daemon_threads = True
+        request_queue_size = 1024
+
+    server = Server(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_proxy(engine):
+    """Processo do proxy (chamado com --serve)."""
+    sys.path[:0] = [os.path.join(HERE, 'kodistubs'), ROOT]
+    import logging
+    import xbmc
+    # o stub devolve True em waitForAbort, o que encerraria o proxy
+    xbmc.Monitor.waitForAbort = lambda self, timeout=0: time.sleep(timeout) or False
+    import proxy
+    logging.getLogger().setLevel(logging.WARNING)
+    proxy.kodiproxy()
+    while not proxy.SHUTDOWN_EVENT.is_set():
+        time.sleep(0.5)
+
+
+def thread_count(pid):
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('Threads:'):
+                    return int(line.split()[1])
+    except OSError:
+        return None
+
+
+def fetch(path, results, index):
+    started = time.perf_counter()
+    sock = socket.create_connection(('127.0.0.1', PROXY_PORT), timeout=60)
+    try:
+        sock.sendall(f'GET {path} HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n'.encode('utf-8'))
+        size = 0
+        while True:
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            size += len(chunk)
+    finally:
+        sock.close()
+    results[index] = (time.perf_counter() - started, size)
+
+
+def percentile(values, pct):
+    values = sorted(values)
+    return values[max(0, int(round(len(values) * pct / 100.0)) - 1)]
+
+
+def wait_port(timeout=10):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', PROXY_PORT), timeout=0.2).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark do proxy local (threads x asyncio).')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--delay', type=float, default=0.3, help='atraso do servidor de origem por segmento (s)')
+    parser.add_argument('--serve', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.serve is not None:
+        run_proxy(args.serve)
+        return
+
+    upstream = upstream_server(args.delay)
+    base = f'http://127.0.0.1:{upstream.server_address[1]}'
+    workdir = tempfile.mkdtemp(prefix='xtreamtotal-bench-')
+    print(f'{"motor":<8} {"cenário":<10} {"pedidos":>7} {"total":>8} {"p50":>8} {"p95":>8} {"threads":>8}')
+    try:
+        for name, engine in ENGINES:
+            env = dict(os.environ, XT_PROFILE=workdir, XT_SETTINGS=json.dumps({'proxy_engine': engine}))
+            proc = subprocess.Popen([sys.executable, os.path.abspath(__file__), '--serve', engine], env=env)
+            try:
+                if not wait_port():
+                    print(f'{name}: proxy não subiu na porta {PROXY_PORT}')
+                    continue
+                for scenario, kind in (('segmentos', 'seg'), ('falhas', 'fail')):
+                    results = [None] * args.requests
+                    clients = [threading.Thread(target=fetch, args=(
+                        '/hlsretry?url=' + urllib.parse.quote(f'{base}/live/{kind}/{i}.ts'), results, i))
+                        for i in range(args.requests)]
+                    peak = [thread_count(proc.pid)]
+                    started = time.perf_counter()
+                    for client in clients:
+                        client.start()
+                    while any(client.is_alive() for client in clients):
+                        count = thread_count(proc.pid)
+                        if count is not None:
+                            peak.append(count)
+                        time.sleep(0.02)
+                    elapsed = time.perf_counter() - started
+                    times = [r[0] for r in results if r]
+                    peak = max(p for p in peak if p is not None) if any(p is not None for p in peak) else '-'
+                    print(f'{name:<8} {scenario:<10} {len(times):>7} {elapsed:>7.2f}s '
+                          f'{percentile(times, 50):>7.2f}s {percentile(times, 95):>7.2f}s {peak:>8}')
+            finally:
+                try:
+                    socket.create_connection(('127.0.0.1', PROXY_PORT), timeout=1).sendall(
+                        b'GET /stop HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n')
+                except OSError:
+                    pass
+                try:
+                    proc.wait(5)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+                    proc.wait()
+                time.sleep(0.5)
+    finally:
+        upstream.shutdown()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
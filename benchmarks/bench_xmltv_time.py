@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""Micro-benchmark e verificação de equivalência do decodificador de datas
+XMLTV: parse_xmltv_time_fast() contra parse_xmltv_time().
+
+Primeiro confere os casos de borda (vazio, curto, dígitos não ASCII, data
+impossível, 24:00, segundo bissexto, fusos variados) e N valores aleatórios;
+depois mede os dois decodificadores sobre --count timestamps aleatórios com
+fusos misturados. Entradas inválidas caem no "agora" do parse_xmltv_time,
+então a comparação tolera 1s de diferença nesses casos.
+
+Uso:
+    python benchmarks/bench_xmltv_time.py --count 1000000 --check 200000
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from bench_epg import load_main  # noqa: E402
+
+OFFSETS = (' +0000', ' -0300', ' +0100', '+0530', ' -0930', ' +01:00', 'Z', '', ' ', ' +00', ' UTC')
+
+EDGE_CASES = (
+    None, '', '   ', '2024', '2024010112', '20240101120000',
+    '20240101120000 +0000', '  20240101120000 -0300  ', '20240101120000+0530',
+    '20240101120000 +01:00', '20240229235959 +0000', '20230229120000 +0000',
+    '20241301120000 +0000', '20240101240000 +0000', '20240101235960 +0000',
+    '20240101126000 +0000', '２０２４０１０１１２００００ +0000', '2024010112000a +0000',
+    '19700101000000 +0100', '20240101120000 xyz',
+)
+
+
+def random_timestamp(rng):
+    ts = '%04d%02d%02d%02d%02d%02d' % (rng.randint(2000, 2035), rng.randint(1, 12), rng.randint(1, 28),
+                                         rng.randint(0, 23), rng.randint(0, 59), rng.randint(0, 59))
+    return ts + rng.choice(OFFSETS)
+
+
+def same(main, ts):
+    expected = main.parse_xmltv_time(ts)
+    got = main.parse_xmltv_time_fast(ts)
+    return abs(expected - got) <= 1 if abs(expected - time.time()) <= 2 else expected == got
+
+
+def best_of(fn, values, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for ts in values:
+            fn(ts)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='parse_xmltv_time_fast x parse_xmltv_time.')
+    parser.add_argument('--count', type=int, default=1000000, help='timestamps no benchmark')
+    parser.add_argument('--check', type=int, default=200000, help='valores aleatórios na verificação')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='xtreamtotal-bench-')
+    try:
+        addon = load_main(workdir, {})
+        rng = random.Random(args.seed)
+
+        failures = [ts for ts in EDGE_CASES if not same(addon, ts)]
+        checked = [random_timestamp(rng) for _ in range(args.check)]
+        failures += [ts for ts in checked if not same(addon, ts)]
+        print(f'equivalência: {len(EDGE_CASES)} casos de borda + {len(checked)} aleatórios, '
+              f'{len(failures)} diferenças')
+        for ts in failures[:10]:
+            print(f'  {ts!r}: {addon.parse_xmltv_time(ts)} != {addon.parse_xmltv_time_fast(ts)}')
+
+        values = [random_timestamp(rng) for _ in range(args.count)]
+        print(f'{"decodificador":<24} {"total":>9} {"por valor":>10}')
+        for name in ('parse_xmltv_time', 'parse_xmltv_time_fast'):
+            elapsed = best_of(getattr(addon, name), values, args.repeat)
+            print(f'{name:<24} {elapsed:>7.2f} s {elapsed / len(values) * 1e6:>7.2f} µs')
+        if failures:
+            raise SystemExit(1)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Stub mínimo do módulo xbmc para rodar os benchmarks fora do Kodi."""
+LOGDEBUG = 0
+LOGINFO = 1
+LOGWARNING = 2
+LOGERROR = 4
+
+LOG_LINES = []
+
+
+def log(msg, level=LOGDEBUG):
+    LOG_LINES.append((level, msg))
+
+
+class InfoTagVideo(object):
+    def __init__(self):
+        self.info = {}
+
+    def setTitle(self, title):
+        self.info['title'] = title
+
+    def setPlot(self, plot):
+        self.info['plot'] = plot
+
+    def setMediaType(self, media_type):
+        self.info['mediatype'] = media_type
+
+
+def translatePath(path):
+    return path
+
+
+def executebuiltin(command, wait=False):
+    pass
+
+
+def getCondVisibility(condition):
+    return False
+
+
+def sleep(ms):
+    pass
+
+
+def getGlobalIdleTime():
+    return 3600
+
+
+class Monitor(object):
+    def onSettingsChanged(self):
+        pass
+
+    def abortRequested(self):
+        return False
+
+    def waitForAbort(self, timeout=0):
+        return True
+
+
+class Player(object):
+    def play(self, item=None, listitem=None):
+        pass
+
+    def isPlaying(self):
+        return False
+
+
+class Keyboard(object):
+    def __init__(self, default='', heading=''):
+        self._text = default
+
+    def doModal(self):
+        pass
+
+    def isConfirmed(self):
+        return False
+
+    def getText(self):
+        return self._text
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""Stub de xbmcaddon: configurações e perfil vêm das variáveis de ambiente
+XT_PROFILE e XT_SETTINGS (JSON) definidas pelo benchmark."""
+import json
+import os
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class Addon(object):
+    def __init__(self, id=None):
+        self._settings = json.loads(os.environ.get('XT_SETTINGS') or '{}')
+
+    def getAddonInfo(self, key):
+        return {
+            'id': 'plugin.video.xtreamtotal',
+            'name': 'Xtream Total',
+            'version': 'bench',
+            'path': _ROOT,
+            'profile': os.environ.get('XT_PROFILE', os.path.join(_ROOT, '.bench_profile')),
+        }.get(key, '')
+
+    def getSetting(self, key):
+        return str(self._settings.get(key, ''))
+
+    def setSetting(self, key, value):
+        self._settings[key] = value
+
+    def openSettings(self):
+        pass
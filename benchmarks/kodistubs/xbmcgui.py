@@ -0,0 +1,44 @@
+# -*- coding: utf-8 -*-
+from xbmc import InfoTagVideo
+
+NOTIFICATION_INFO = 'info'
+NOTIFICATION_WARNING = 'warning'
+NOTIFICATION_ERROR = 'error'
+
+
+class ListItem(object):
+    def __init__(self, label='', label2='', path='', offscreen=False):
+        self.label = label
+        self.path = path
+        self.art = {}
+        self.info = {}
+        self.properties = {}
+        self._tag = None
+
+    def setArt(self, art):
+        self.art.update(art)
+
+    def setInfo(self, type, info):
+        self.info.update(info)
+
+    def setProperty(self, key, value):
+        self.properties[key] = value
+
+    def setPath(self, path):
+        self.path = path
+
+    def getVideoInfoTag(self):
+        if self._tag is None:
+            self._tag = InfoTagVideo()
+        return self._tag
+
+
+class Dialog(object):
+    def ok(self, heading, message):
+        return True
+
+    def textviewer(self, heading, text):
+        pass
+
+    def notification(self, heading, message, icon='', time=5000, sound=True):
+        pass
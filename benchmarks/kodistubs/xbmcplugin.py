@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+SORT_METHOD_NONE = 0
+SORT_METHOD_LABEL = 1
+SORT_METHOD_UNSORTED = 40
+
+ITEMS = []
+
+
+def addDirectoryItem(handle, url, listitem, isFolder=False, totalItems=0):
+    ITEMS.append((url, listitem, isFolder))
+    return True
+
+
+def addDirectoryItems(handle, items, totalItems=0):
+    ITEMS.extend(items)
+    return True
+
+
+def endOfDirectory(handle, succeeded=True, updateListing=False, cacheToDisc=True):
+    pass
+
+
+def setResolvedUrl(handle, succeeded, listitem):
+    pass
+
+
+def setContent(handle, content):
+    pass
+
+
+def addSortMethod(handle, sortMethod, label2Mask=''):
+    pass
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+import os
+
+
+def translatePath(path):
+    return path
+
+
+def exists(path):
+    return os.path.exists(path)
+
+
+def mkdir(path):
+    os.makedirs(path, exist_ok=True)
+    return True
+
+
+def mkdirs(path):
+    os.makedirs(path, exist_ok=True)
+    return True
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""Gera arquivos XMLTV sintéticos, no formato dos servidores Xtream, para
+medir o EPG sem depender de um provedor real.
+
+Uso:
+    python benchmarks/xmltv_gen.py saida.xml --channels 1200 --days 10
+"""
+import argparse
+import gzip
+import random
+import time
+from xml.sax.saxutils import escape, quoteattr
+
+WORDS = ('futebol', 'novela', 'jornal', 'filme', 'ação', 'série', 'ao vivo', 'reprise',
+         'documentário', 'esporte', 'culinária', 'infantil', 'música', 'notícias', '&', '<br>')
+OFFSETS = (' +0000', ' -0300', '+0100', ' +0530', ' -0000', '', ' +01:00')
+DURATIONS = (900, 1800, 1800, 3600, 3600, 5400, 7200)
+
+
+def channel_id(index):
+    return f'Canal{index}.br'
+
+
+def _xmltv_time(ts, offset):
+    # aplica o fuso como parse_xmltv_time o interpreta ('+01:00' vale 0),
+    # para que o texto represente o mesmo instante
+    secs = 0
+    compact = offset.strip().replace(' ', '')
+    if compact[:1] in ('+', '-') and len(compact) >= 5:
+        try:
+            secs = (1 if compact[0] == '+' else -1) * (int(compact[1:3]) * 3600 + int(compact[3:5]) * 60)
+        except ValueError:
+            secs = 0
+    return time.strftime('%Y%m%d%H%M%S', time.gmtime(ts + secs)) + offset
+
+
+def generate_xmltv(path, channels=300, days=7, desc_words=40, timestamps='mixed', seed=1, start=None):
+    """Escreve o XMLTV em `path` (gzip se terminar em .gz). `timestamps`:
+    'xmltv' (só start/stop com fuso), 'unix' (start_timestamp/stop_timestamp)
+    ou 'mixed'. A grade começa `days`/2 dias antes de `start` (padrão: agora).
+    Retorna o número de programas gerados."""
+    rnd = random.Random(seed)
+    if start is None:
+        start = int(time.time())
+    t0 = (start - days * 86400 // 2) // 900 * 900
+    t_end = t0 + days * 86400
+    opener = gzip.open if path.endswith('.gz') else open
+    total = 0
+    with opener(path, 'wt', encoding='utf-8') as f:
+        f.write('<?xml version="1.0" encoding="utf-8" ?>\n')
+        f.write('<tv generator-info-name="xtreamtotal-bench">\n')
+        for c in range(channels):
+            f.write(f'<channel id={quoteattr(channel_id(c))}><display-name>{escape(f"Canal {c} HD")}</display-name>'
+                    f'<icon src="http://example.com/{c}.png" /></channel>\n')
+        for c in range(channels):
+            cid = quoteattr(channel_id(c))
+            t = t0
+            while t < t_end:
+                dur = rnd.choice(DURATIONS)
+                mode = timestamps if timestamps != 'mixed' else rnd.choice(('xmltv', 'xmltv', 'unix'))
+                if mode == 'unix':
+                    times = f'start="{_xmltv_time(t, " +0000")}" stop="{_xmltv_time(t + dur, " +0000")}" ' \
+                            f'start_timestamp="{t}" stop_timestamp="{t + dur}"'
+                else:
+                    offset = rnd.choice(OFFSETS)
+                    times = f'start="{_xmltv_time(t, offset)}" stop="{_xmltv_time(t + dur, offset)}"'
+                title = f'Programa {rnd.randint(1, 5000)} - {rnd.choice(WORDS)}'
+                desc = ' '.join(rnd.choice(WORDS) for _ in range(desc_words))
+                f.write(f'<programme {times} channel={cid}><title lang="pt">{escape(title)}</title>'
+                        f'<desc lang="pt">{escape(desc)}</desc></programme>\n')
+                total += 1
+                t += dur
+        f.write('</tv>\n')
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Gera um XMLTV sintético.')
+    parser.add_argument('path')
+    parser.add_argument('--channels', type=int, default=300)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--desc-words', type=int, default=40)
+    parser.add_argument('--timestamps', choices=('xmltv', 'unix', 'mixed'), default='mixed')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+    total = generate_xmltv(args.path, args.channels, args.days, args.desc_words, args.timestamps, args.seed)
+    print(f'{args.path}: {args.channels} canais, {total} programas')
+
+
+if __name__ == '__main__':
+    main()
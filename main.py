@@ -1,49 +1,169 @@
 # -*- coding: utf-8 -*-
+import time
+_STARTED = time.perf_counter()
 import sys
 import os
-import time
 import json
 import html
+import base64
+import hashlib
 import calendar
+import importlib
+import codecs
+import itertools
+import zlib
+import sqlite3
+import bisect
+import heapq
+import unicodedata
+from array import array
 import urllib.parse
-import xml.etree.ElementTree as ET
+import threading
+import socket
 from datetime import datetime
 
-from proxy_http_scraper import ProxyScraper
 import xbmc
 import xbmcgui
 import xbmcplugin
 import xbmcaddon
 import xbmcvfs
-import requests
-import proxy_http_scraper
+import backend
+import perftrace
+
+# requests (com o DNS customizado e o proxy), ElementTree, concurrent.futures
+# e afins só são importados pelas rotas que os usam: ver lazy_import() e net()
+STARTUP_TIMES = []  # (fase, ms), para o relatório de inicialização
 
-from dns import customdns
-customdns(cache_ttl=14400)  # Ativa DNS customizado com cache de 4 horas
+def startup_mark(phase, started):
+    STARTUP_TIMES.append((phase, (time.perf_counter() - started) * 1000))
+
+startup_mark('imports', _STARTED)
 
 # =========================
 # Configurações do Addon
 # =========================
 ADDON = xbmcaddon.Addon()
 ADDON_ID = ADDON.getAddonInfo('id')
-ADDON_HANDLE = int(sys.argv[1])
-BASE_URL = ADDON.getSetting('host') or ''
-USERNAME = ADDON.getSetting('username') or ''
-PASSWORD = ADDON.getSetting('password') or ''
-RETRY = ADDON.getSetting('retry') or 'false'
-PROXY_HTTP = ADDON.getSetting('proxy_http') or 'false'
-ENABLE_EPG = ADDON.getSetting('enable_epg') or 'false'
+# o serviço importa este módulo sem handle de plugin
+ADDON_HANDLE = int(sys.argv[1]) if len(sys.argv) > 1 and sys.argv[1].lstrip('-').isdigit() else -1
+
+def get_int_setting(name, default):
+    try:
+        return int(ADDON.getSetting(name) or default)
+    except ValueError:
+        return default
+
+def load_settings():
+    """(Re)lê as configurações; o serviço chama de novo quando elas mudam."""
+    global ADDON, BASE_URL, USERNAME, PASSWORD, RETRY, PROXY_HTTP, ENABLE_EPG, EPG_MODE
+    global EPG_PAST_HOURS, EPG_FUTURE_HOURS, SERVICE_PREWARM, PAGE_SIZE, SERIES_PREFETCH
+    global SERVICE_BACKEND, STARTUP_TIMING, TRACE, MIRRORS, ART_CACHE
+    ADDON = xbmcaddon.Addon()
+    BASE_URL = ADDON.getSetting('host') or ''
+    MIRRORS = ADDON.getSetting('mirrors') or ''
+    ART_CACHE = ADDON.getSetting('art_cache') or 'true'
+    USERNAME = ADDON.getSetting('username') or ''
+    PASSWORD = ADDON.getSetting('password') or ''
+    RETRY = ADDON.getSetting('retry') or 'false'
+    PROXY_HTTP = ADDON.getSetting('proxy_http') or 'false'
+    ENABLE_EPG = ADDON.getSetting('enable_epg') or 'false'
+    EPG_MODE = ADDON.getSetting('epg_mode') or '0'  # 0 = XMLTV completo, 1 = por canal (get_short_epg)
+    EPG_PAST_HOURS = get_int_setting('epg_past_hours', 6)
+    EPG_FUTURE_HOURS = get_int_setting('epg_future_hours', 48)
+    SERVICE_PREWARM = ADDON.getSetting('service_prewarm') or 'true'
+    PAGE_SIZE = get_int_setting('page_size', 300)  # 0 = categoria inteira numa página
+    SERIES_PREFETCH = ADDON.getSetting('series_prefetch') or 'false'
+    SERVICE_BACKEND = ADDON.getSetting('service_backend') or 'true'
+    STARTUP_TIMING = ADDON.getSetting('startup_timing') or 'false'
+    TRACE = ADDON.getSetting('trace') or 'false'
+
+def settings_key():
+    """Configurações que mudam as listagens; o backend só atende com as mesmas."""
+    return [BASE_URL, MIRRORS, USERNAME, PASSWORD, PROXY_HTTP, ENABLE_EPG, EPG_MODE,
+            EPG_PAST_HOURS, EPG_FUTURE_HOURS, PAGE_SIZE]
+
+_settings_started = time.perf_counter()
+load_settings()
+startup_mark('configurações', _settings_started)
 USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36'
 HEADERS = {'User-Agent': USER_AGENT}
 HOME = ADDON.getAddonInfo('path')
 addonIcon = xbmcvfs.translatePath(os.path.join(HOME, 'icon.png'))
 
 PROFILE_DIR = xbmcvfs.translatePath(ADDON.getAddonInfo('profile'))
-EPG_XML_PATH = os.path.join(PROFILE_DIR, 'epg.xml')
+EPG_XML_PATH = os.path.join(PROFILE_DIR, 'epg.xml.gz')  # guia já recortado pela janela de retenção
+EPG_DOWNLOAD_PATH = os.path.join(PROFILE_DIR, 'epg_download.xml.tmp')
+EPG_LEGACY_XML_PATH = os.path.join(PROFILE_DIR, 'epg.xml')
 EPG_META_PATH = os.path.join(PROFILE_DIR, 'epg_meta.json')
+EPG_DB_PATH = os.path.join(PROFILE_DIR, 'epg.db')
 EPG_TTL = 24 * 3600  # 24h
+EPG_CHUNK_SIZE = 1024 * 1024
+EPG_SHORT_CACHE_PATH = os.path.join(PROFILE_DIR, 'epg_short_cache.json')
+EPG_SHORT_TTL = 30 * 60
+EPG_SHORT_LIMIT = 4
+EPG_SHORT_WORKERS = 8
+EPG_ANNOTATE_CHUNK = 500
+EPG_LOCK_PATH = os.path.join(PROFILE_DIR, 'epg.lock')
+
+API_CACHE_DIR = os.path.join(PROFILE_DIR, 'api_cache')
+# validade por ação; depois disso a resposta ainda é servida (e renovada em
+# segundo plano) até API_CACHE_STALE_MAX, e sem limite se o host cair
+API_CACHE_TTLS = {
+    'get_live_categories': 6 * 3600,
+    'get_vod_categories': 12 * 3600,
+    'get_series_categories': 12 * 3600,
+    'get_live_streams': 1 * 3600,
+    'get_vod_streams': 6 * 3600,
+    'get_series': 6 * 3600,
+    'get_series_info': 12 * 3600,
+}
+API_CACHE_STALE_MAX = 7 * 24 * 3600
+CATALOG_DB_PATH = os.path.join(PROFILE_DIR, 'catalog.db')
+# listas completas guardadas no catálogo em vez do cache JSON
+CATALOG_KINDS = {'get_live_streams': 'live', 'get_vod_streams': 'vod', 'get_series': 'series'}
+CATALOG_BATCH = 2000
+CATALOG_SCHEMA = 2  # ao mudar, o catálogo é recriado e ressincronizado
+SEARCH_SOURCES = (
+    ('get_live_streams', 'Live: ', True),
+    ('get_vod_streams', 'Filme: ', True),
+    ('get_series', 'Série: ', False),
+)
+SEARCH_LIMIT = 500
+SEARCH_WORKERS = 3
+SERIES_PREFETCH_MAX = 60
+SERIES_PREFETCH_WORKERS = 4
+API_REFRESH_JOIN_TIMEOUT = 60
+API_CHUNK_SIZE = 64 * 1024
+SERVICE_STATUS_PATH = os.path.join(PROFILE_DIR, 'service_status.json')
+TRACE_PATH = os.path.join(PROFILE_DIR, perftrace.TRACE_FILE)
+SERVICE_HEARTBEAT_MAX_AGE = 5 * 60
+HTTP_POOL_SIZE = 10  # cobre os workers do EPG curto e as renovações em segundo plano
+HTTP_RETRIES = 2
+HTTP_BACKOFF = 0.5
+PROXY_PORT = 8097  # proxy.PORT; as listagens não importam o proxy (nem o requests)
+ART_PREFETCH_MAX = 1000
+ART_PROXY_RECHECK = 60  # proxy fora do ar: nova tentativa só depois disso (backend residente)
+MIRRORS_PATH = os.path.join(PROFILE_DIR, 'mirrors.json')
+MIRROR_TTL = 30 * 60  # ranking dos espelhos vale 30 min
+MIRROR_PROBE_TIMEOUT = 4
+MIRROR_FAIL_COOLDOWN = 5 * 60  # espelho que falhou fica fora do ranking por 5 min
 
 _EPG_PARSED = None
+_API_REFRESH_THREADS = {}
+_API_PENDING_STREAMS = []  # respostas paginadas lidas só até a página exibida
+_INFO_TAG_SETTERS = hasattr(getattr(xbmc, 'InfoTagVideo', None), 'setPlot')
+_QS_SAFE_CHARS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_.-=&')
+_HTTP_SESSION = None
+_HTTP_SESSION_LOCK = threading.Lock()
+_REQUESTS = None
+_NET_LOCK = threading.Lock()
+_MIRROR_LOCK = threading.Lock()
+_TRACE_SPANS = None  # {span: [chamadas, ms, bytes]} da tela atual, com o trace ligado
+_TRACE_LOCK = threading.Lock()
+HTTP_STATS = {'requests': 0, 'seconds': 0.0}
+_XMLTV_DAY_CACHE = {}
+_XMLTV_OFFSET_CACHE = {}
+_ART_PROXY_UP = {'up': False, 'checked': None}  # sondagem do proxy, reaproveitada no processo
 
 # =========================
 # Utilitários
@@ -51,9 +171,49 @@ _EPG_PARSED = None
 def log(msg, level=xbmc.LOGDEBUG):
     xbmc.log(f"[{ADDON_ID}] {msg}", level)
 
+# no backend do serviço os avisos da rota voltam na resposta e o plugin os exibe
+_DIALOGS = threading.local()
+
+def dialogs_capture():
+    _DIALOGS.queue = []
+
+def dialogs_release():
+    queue = getattr(_DIALOGS, 'queue', None) or []
+    _DIALOGS.queue = None
+    return queue
+
+def dialogs_bind(fn):
+    # workers de pool não herdam o threading.local: usam a fila da rota
+    queue = getattr(_DIALOGS, 'queue', None)
+    def bound(*args):
+        _DIALOGS.queue = queue
+        try:
+            return fn(*args)
+        finally:
+            _DIALOGS.queue = None
+    return bound
+
+def dialogs_show(entries):
+    for kind, title, message, icon in entries:
+        if kind == 'ok':
+            xbmcgui.Dialog().ok(title, message)
+        else:
+            xbmcgui.Dialog().notification(title, message, icon, 5000)
+
 def show_dialog(title, message):
+    queue = getattr(_DIALOGS, 'queue', None)
+    if queue is not None:
+        queue.append(('ok', title, message, None))
+        return
     xbmcgui.Dialog().ok(title, message)
 
+def show_notification(title, message, icon=xbmcgui.NOTIFICATION_INFO):
+    queue = getattr(_DIALOGS, 'queue', None)
+    if queue is not None:
+        queue.append(('notification', title, message, icon))
+        return
+    xbmcgui.Dialog().notification(title, message, icon, 5000)
+
 def build_url(**kwargs):
     return sys.argv[0] + '?' + urllib.parse.urlencode(kwargs)
 
@@ -76,42 +236,905 @@ def get_param(name, default=""):
 def fingerprint():
     return f"{BASE_URL}|{USERNAME}|{PASSWORD}"
 
+def lazy_import(name):
+    """Importa o módulo no primeiro uso, anotando o tempo no relatório de inicialização."""
+    module = sys.modules.get(name)
+    if module is None:
+        started = time.perf_counter()
+        module = importlib.import_module(name)
+        startup_mark(f"import {name}", started)
+    return module
+
+def net():
+    """Módulo requests, importado sob demanda depois de ativar o DNS customizado."""
+    global _REQUESTS
+    with _NET_LOCK:
+        if _REQUESTS is None:
+            dns = lazy_import('dns')  # o import já é anotado à parte
+            started = time.perf_counter()
+            dns.customdns(cache_ttl=14400)  # Ativa DNS customizado com cache de 4 horas
+            startup_mark('DNS customizado', started)
+            _REQUESTS = lazy_import('requests')
+    return _REQUESTS
+
+def http_errors():
+    # no except: só é avaliado quando há exceção, então não importa o requests à toa
+    return net().RequestException
+
+def trace_begin(enabled=None):
+    global _TRACE_SPANS
+    if enabled is None:
+        enabled = TRACE == 'true'
+    _TRACE_SPANS = {} if enabled else None
+
+def trace_add(name, started, nbytes=0):
+    """Soma ao span `name` o tempo desde `started` (perf_counter)."""
+    if _TRACE_SPANS is None:
+        return
+    ms = (time.perf_counter() - started) * 1000
+    with _TRACE_LOCK:
+        span = _TRACE_SPANS.setdefault(name, [0, 0.0, 0])
+        span[0] += 1
+        span[1] += ms
+        span[2] += nbytes
+
+def trace_chunks(name, chunks):
+    """Repassa os pedaços do corpo HTTP, somando tempo de rede e bytes no span `name`."""
+    if _TRACE_SPANS is None:
+        return chunks
+    return _trace_chunks(name, chunks)
+
+def _trace_chunks(name, chunks):
+    chunks = iter(chunks)
+    while True:
+        started = time.perf_counter()
+        chunk = next(chunks, None)
+        if chunk is None:
+            trace_add(name, started)
+            return
+        trace_add(name, started, len(chunk))
+        yield chunk
+
+def trace_end(mode, started, source='plugin'):
+    """Grava a tela no trace rotativo do perfil."""
+    global _TRACE_SPANS
+    if _TRACE_SPANS is None:
+        return
+    with _TRACE_LOCK:
+        spans, _TRACE_SPANS = _TRACE_SPANS, None
+    entry = {
+        'ts': int(time.time()),
+        'mode': mode,
+        'source': source,
+        'ms': round((time.perf_counter() - started) * 1000, 1),
+        'spans': {name: [calls, round(ms, 1), nbytes] for name, (calls, ms, nbytes) in spans.items()},
+    }
+    try:
+        ensure_profile_dir()
+        perftrace.append(TRACE_PATH, entry)
+    except OSError as e:
+        log(f"Falha ao gravar o trace: {e}", xbmc.LOGERROR)
+
+def log_startup_timing():
+    if STARTUP_TIMING != 'true':
+        return
+    startup_mark('total', _STARTED)
+    log("Inicialização: " + ", ".join(f"{phase} {ms:.1f} ms" for phase, ms in STARTUP_TIMES), xbmc.LOGINFO)
+
+def get_http_session():
+    """Sessão HTTP única do processo (keep-alive, pool e retentativas)."""
+    global _HTTP_SESSION
+    with _HTTP_SESSION_LOCK:
+        if _HTTP_SESSION is None:
+            requests = net()
+            Retry = lazy_import('urllib3.util.retry').Retry
+            session = requests.Session()
+            session.headers.update(HEADERS)
+            retries = Retry(total=HTTP_RETRIES, backoff_factor=HTTP_BACKOFF,
+                            status_forcelist=(500, 502, 503, 504), allowed_methods=('GET',),
+                            raise_on_status=False)
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE, max_retries=retries)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+
+            # Se houver proxy definido, adiciona
+            if PROXY_HTTP == 'true':
+                scraper = lazy_import('proxy_http_scraper').ProxyScraper()
+                proxy = scraper.get_proxy()
+                if proxy:
+                    session.proxies.update({
+                        "http": proxy,
+                        "https": proxy
+                    })
+            _HTTP_SESSION = session
+        return _HTTP_SESSION
+
+def http_session_reset():
+    """Descarta a sessão (ex.: proxy/host alterados nas configurações)."""
+    global _HTTP_SESSION
+    with _HTTP_SESSION_LOCK:
+        if _HTTP_SESSION is not None:
+            _HTTP_SESSION.close()
+        _HTTP_SESSION = None
+
+def http_stats():
+    """Requisições feitas e conexões abertas pela sessão neste processo."""
+    stats = dict(HTTP_STATS)
+    connections = 0
+    if _HTTP_SESSION is not None:
+        for adapter in set(_HTTP_SESSION.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    connections += pool.num_connections
+    stats['connections'] = connections
+    return stats
+
+def log_http_stats():
+    stats = http_stats()
+    if stats['requests']:
+        log(f"HTTP: {stats['requests']} requisições, {stats['connections']} conexões, "
+            f"{stats['seconds'] * 1000:.0f} ms", xbmc.LOGINFO)
+
 def safe_requests_get(url, **kw):
-    kw.setdefault('headers', HEADERS)
+    """GET pela sessão compartilhada, com failover para o próximo espelho."""
     kw.setdefault('timeout', 30)
+    tried = set()
+    while True:
+        started = time.time()
+        traced = time.perf_counter()
+        try:
+            try:
+                r = get_http_session().get(url, **kw)
+            finally:
+                HTTP_STATS['requests'] += 1
+                HTTP_STATS['seconds'] += time.time() - started
+            # com stream=True o corpo é contado por trace_chunks()
+            trace_add('http', traced, 0 if kw.get('stream') else len(r.content))
+            r.raise_for_status()
+            return r
+        except http_errors() as e:
+            tried.add(url)
+            alternative = mirror_failover(url, e)
+            if not alternative or alternative in tried:
+                raise
+            log(f"Falha em {url.split('/player_api.php')[0]} ({e}); tentando outro espelho.", xbmc.LOGWARNING)
+            url = alternative
 
-    # Se houver proxy definido, adiciona
-    if PROXY_HTTP == 'true':
-        scraper = proxy_http_scraper.ProxyScraper()
-        proxy = scraper.get_proxy()
-        if proxy:
-            kw.setdefault('proxies', {
-                "http": proxy,
-                "https": proxy
-            })
+# =========================
+# Espelhos do servidor
+# =========================
+def mirror_hosts():
+    """Host principal e espelhos da configuração, sem repetição."""
+    hosts = []
+    for host in [BASE_URL] + MIRRORS.replace(';', ',').replace('\n', ',').split(','):
+        host = host.strip().rstrip('/')
+        if host and host not in hosts:
+            hosts.append(host)
+    return hosts
+
+def mirror_state_load():
+    """Ranking salvo, se for da mesma lista de hosts e conta."""
+    try:
+        with open(MIRRORS_PATH, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except Exception:
+        return None
+    if state.get('hosts') != mirror_hosts() or state.get('username') != USERNAME:
+        return None
+    return state
 
-    r = requests.get(url, **kw)
-    r.raise_for_status()
-    return r
+def mirror_state_save(state):
+    try:
+        ensure_profile_dir()
+        tmp_path = f"{MIRRORS_PATH}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(state, f)
+        os.replace(tmp_path, MIRRORS_PATH)
+    except Exception as e:
+        log(f"Falha ao salvar espelhos: {e}", xbmc.LOGERROR)
+
+def mirror_probe_one(host):
+    """Latência (s) da API no espelho, ou None se ele não respondeu com a conta válida."""
+    started = time.perf_counter()
+    try:
+        # fora da sessão compartilhada: as retentativas dela atrasariam a medição
+        r = net().get(f"{host}/player_api.php?username={USERNAME}&password={PASSWORD}", headers=HEADERS,
+                      proxies=get_http_session().proxies, timeout=MIRROR_PROBE_TIMEOUT)
+        data = r.json() if r.status_code == 200 else None
+    except Exception:
+        return None
+    user_info = data.get('user_info') if isinstance(data, dict) else None
+    if not isinstance(user_info, dict) or str(user_info.get('auth', 1)) == '0':
+        return None
+    return time.perf_counter() - started
+
+def mirror_probe():
+    """Mede os espelhos em paralelo e salva o ranking dos saudáveis."""
+    hosts = mirror_hosts()
+    with lazy_import('concurrent.futures').ThreadPoolExecutor(max_workers=len(hosts)) as pool:
+        latencies = list(pool.map(mirror_probe_one, hosts))
+    healthy = sorted((latency, host) for host, latency in zip(hosts, latencies) if latency is not None)
+    state = {
+        'hosts': hosts,
+        'username': USERNAME,
+        'checked_at': time.time(),
+        'ranked': [host for _, host in healthy],
+        'latency_ms': {host: round(latency * 1000) for latency, host in healthy},
+    }
+    with _MIRROR_LOCK:
+        # espelho que falhou há pouco fica fora mesmo se respondeu à medição
+        previous = mirror_state_load() or {}
+        now = time.time()
+        state['failed'] = {host: at for host, at in previous.get('failed', {}).items()
+                           if now - at < MIRROR_FAIL_COOLDOWN}
+        mirror_state_save(state)
+    log(f"Espelhos: {', '.join(f'{h} {ms} ms' for h, ms in state['latency_ms'].items()) or 'nenhum respondeu'}"
+        f" ({len(hosts) - len(healthy)} fora do ar)", xbmc.LOGINFO)
+    return state
+
+def mirror_stale(state=None):
+    if len(mirror_hosts()) < 2:
+        return False
+    state = state or mirror_state_load()
+    return state is None or time.time() - state.get('checked_at', 0) >= MIRROR_TTL
+
+def api_base():
+    """Host da API e dos streams: o espelho saudável mais rápido ou o host principal."""
+    if len(mirror_hosts()) < 2:
+        return BASE_URL.rstrip('/')
+    state = mirror_state_load()
+    if mirror_stale(state) and (state is None or not service_alive()):
+        state = mirror_probe()
+    return mirror_pick(state)
+
+def mirror_pick(state):
+    now = time.time()
+    for host in state['ranked']:
+        if now - state['failed'].get(host, 0) >= MIRROR_FAIL_COOLDOWN:
+            return host
+    return BASE_URL.rstrip('/')
+
+def mirror_failover(url, error):
+    """Marca o espelho de `url` como falho e devolve a URL no próximo, ou None."""
+    hosts = mirror_hosts()
+    if len(hosts) < 2:
+        return None
+    response = getattr(error, 'response', None)
+    if response is not None and response.status_code < 500:
+        return None  # 4xx: os espelhos são equivalentes, daria o mesmo erro
+    host = next((h for h in hosts if url.startswith(h + '/')), None)
+    if host is None:
+        return None
+    with _MIRROR_LOCK:
+        state = mirror_state_load()
+        if state is None:
+            return None
+        state['failed'][host] = time.time()
+        mirror_state_save(state)
+    # do ranking salvo, sem medir de novo (a medição apagaria a marca acima)
+    alternative = mirror_pick(state)
+    return alternative + url[len(host):] if alternative != host else None
+
+def acquire_lock(path, max_age=1800):
+    """Trava entre processos via arquivo O_EXCL; travas mais velhas que `max_age` expiram."""
+    for _ in range(2):
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) < max_age:
+                    return False
+                os.remove(path)
+            except OSError:
+                return False
+    return False
+
+def release_lock(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+def service_alive():
+    """True se o serviço de segundo plano deu sinal de vida recentemente."""
+    try:
+        with open(SERVICE_STATUS_PATH, 'r', encoding='utf-8') as f:
+            status = json.load(f)
+        return time.time() - status.get('heartbeat', 0) < SERVICE_HEARTBEAT_MAX_AGE
+    except Exception:
+        return False
+
+# =========================
+# Cache de respostas da API
+# =========================
+def api_action(endpoint):
+    return urllib.parse.parse_qs(endpoint).get('action', [''])[0]
+
+def api_cache_ttl(endpoint):
+    """Validade do cache para o endpoint, ou None se ele não é cacheado."""
+    return API_CACHE_TTLS.get(api_action(endpoint))
+
+def api_cache_path(endpoint):
+    key = hashlib.md5(f"{fingerprint()}|{endpoint}".encode('utf-8')).hexdigest()
+    return os.path.join(API_CACHE_DIR, key + '.json')
+
+def api_cache_entry(endpoint):
+    """Retorna (dados, idade em segundos) do cache, ou (None, None)."""
+    try:
+        with open(api_cache_path(endpoint), 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+        return entry.get('data'), time.time() - entry.get('fetched_at', 0)
+    except Exception:
+        return None, None
+
+def api_cache_load(endpoint, max_age=None):
+    """Dados do cache com no máximo `max_age` segundos (padrão: a validade da ação)."""
+    if max_age is None:
+        max_age = api_cache_ttl(endpoint) or 0
+    data, age = api_cache_entry(endpoint)
+    if data is not None and age < max_age:
+        return data
+    return None
+
+def api_cache_save(endpoint, data):
+    try:
+        if not os.path.exists(API_CACHE_DIR):
+            os.makedirs(API_CACHE_DIR)
+        path = api_cache_path(endpoint)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'fetched_at': time.time(), 'endpoint': endpoint, 'data': data}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        log(f"Falha ao salvar cache da API: {e}", xbmc.LOGERROR)
+
+def _api_refresh(endpoint, lock_path):
+    try:
+        api_refresh(endpoint)
+        log(f"API (renovado em segundo plano): {endpoint}")
+    except Exception as e:
+        log(f"Falha ao renovar cache da API ({endpoint}): {e}", xbmc.LOGWARNING)
+    finally:
+        release_lock(lock_path)
+        # no serviço o processo continua vivo: a próxima renovação precisa passar
+        _API_REFRESH_THREADS.pop(endpoint, None)
+
+def api_refresh_async(endpoint):
+    """Renova o cache do endpoint numa thread, uma renovação por vez entre processos."""
+    running = _API_REFRESH_THREADS.get(endpoint)
+    if running is not None and running.is_alive():
+        return
+    try:
+        if not os.path.exists(API_CACHE_DIR):
+            os.makedirs(API_CACHE_DIR)
+    except OSError:
+        return
+    lock_path = api_cache_path(endpoint) + '.lock'
+    if not acquire_lock(lock_path, max_age=300):
+        return
+    t = threading.Thread(target=_api_refresh, args=(endpoint, lock_path))
+    _API_REFRESH_THREADS[endpoint] = t
+    t.start()
+
+def api_drain(background=False):
+    """Lê até o fim as respostas paginadas, para gravar o cache e o catálogo."""
+    streams = _API_PENDING_STREAMS[:]
+    del _API_PENDING_STREAMS[:]
+    if background:
+        threading.Thread(target=_api_drain, args=(streams,)).start()
+    else:
+        _api_drain(streams)
+
+def _api_drain(streams):
+    for stream in streams:
+        started = time.perf_counter()
+        count = sum(1 for _ in stream)
+        log(f"API: {count} itens restantes lidos para o cache em {time.perf_counter() - started:.2f}s")
+
+def api_refresh_wait():
+    """Aguarda as renovações pendentes (o diretório já foi entregue ao Kodi)."""
+    deadline = time.time() + API_REFRESH_JOIN_TIMEOUT
+    for t in list(_API_REFRESH_THREADS.values()):
+        t.join(max(0, deadline - time.time()))
+
+def api_cached(endpoint):
+    """Cache válido ou vencido (renovando em segundo plano); None se não houver."""
+    ttl = api_cache_ttl(endpoint)
+    if ttl is None:
+        return None
+    data, age = api_cache_entry(endpoint)
+    if data is None or age >= API_CACHE_STALE_MAX:
+        return None
+    if age >= ttl:
+        log(f"API (cache vencido há {int(age - ttl)}s, renovando): {endpoint}")
+        api_refresh_async(endpoint)
+    else:
+        log(f"API (cache): {endpoint}")
+    return data
+
+def api_url(endpoint):
+    return f"{api_base()}/player_api.php?username={USERNAME}&password={PASSWORD}&{endpoint}"
+
+def json_iter_array(chunks):
+    """Gera os elementos de um array JSON recebido em pedaços, conforme chegam."""
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8')('replace')
+    buf = ''
+    pos = 0
+    state = 'start'  # start -> items -> end
+    for chunk in itertools.chain(chunks, [None]):
+        final = chunk is None
+        buf = buf[pos:] + text.decode(b'' if final else chunk, final)
+        pos = 0
+        while state != 'end':
+            while pos < len(buf) and buf[pos] in ' \t\r\n,\ufeff':
+                pos += 1
+            if pos >= len(buf):
+                break
+            if state == 'start':
+                if buf[pos] != '[':
+                    log("Resposta da API não é uma lista JSON.", xbmc.LOGWARNING)
+                    state = 'end'
+                    break
+                state = 'items'
+                pos += 1
+                continue
+            if buf[pos] == ']':
+                state = 'end'
+                break
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if final:
+                    raise
+                break  # elemento incompleto: espera o próximo pedaço
+            if end == len(buf) or buf[end] not in ' \t\r\n,]':
+                # um número cortado ('-45' de '-4500.0') decodifica sem erro:
+                # o valor só vale quando vem seguido de um separador
+                if final:
+                    raise ValueError(f"JSON inválido na posição {end}")
+                break
+            pos = end
+            yield value
+        if state == 'end':
+            return
+    if state != 'end':
+        raise ValueError("JSON truncado")
+
+def api_iter(endpoint):
+    """Gera os itens de uma resposta em lista conforme chegam, gravando cache/catálogo."""
+    log(f"API (streaming): {api_url(endpoint)}")
+    r = safe_requests_get(api_url(endpoint), stream=True)
+    items = json_iter_array(trace_chunks('http_body', r.iter_content(API_CHUNK_SIZE)))
+    action = api_action(endpoint)
+    cache_file = cache_tmp = None
+    count = 0
+    try:
+        if action in CATALOG_KINDS and endpoint == f"action={action}":
+            items = catalog_sync_iter(action, items)
+        elif api_cache_ttl(endpoint) is not None:
+            if not os.path.exists(API_CACHE_DIR):
+                os.makedirs(API_CACHE_DIR)
+            cache_path = api_cache_path(endpoint)
+            cache_tmp = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            cache_file = open(cache_tmp, 'w', encoding='utf-8')
+            cache_file.write(f'{{"fetched_at": {time.time()}, "endpoint": {json.dumps(endpoint)}, "data": [')
+        for value in items:
+            if cache_file:
+                cache_file.write((', ' if count else '') + json.dumps(value, ensure_ascii=False))
+            count += 1
+            yield value
+        # cache e catálogo só valem com a resposta completa
+        if cache_file:
+            cache_file.write(']}')
+            cache_file.close()
+            cache_file = None
+            if count:
+                os.replace(cache_tmp, cache_path)
+    finally:
+        r.close()
+        if cache_file:
+            cache_file.close()
+        if cache_tmp and os.path.exists(cache_tmp):
+            os.remove(cache_tmp)
+
+def api_refresh(endpoint):
+    """Atualiza cache/catálogo do endpoint sem devolver os dados."""
+    if api_action(endpoint) in CATALOG_KINDS:
+        for _ in api_iter(endpoint):
+            pass
+    else:
+        fetch_json(endpoint)
+
+def fetch_json(endpoint):
+    """Consulta a API sem cache nem diálogos (levanta exceção) e atualiza o cache."""
+    url = api_url(endpoint)
+    log(f"API: {url}")
+    data = safe_requests_get(url).json()
+    if api_cache_ttl(endpoint) is not None and data:
+        api_cache_save(endpoint, data)
+    return data
 
 def get_json(endpoint):
+    started = time.perf_counter()
+    try:
+        return _get_json(endpoint)
+    finally:
+        trace_add('get_json', started)
+
+def _get_json(endpoint):
     if not all([BASE_URL, USERNAME, PASSWORD]):
         log("Credenciais incompletas.", xbmc.LOGERROR)
         show_dialog("Erro", "Configure host, usuário e senha nas configurações.")
         return None
-    url = f"{BASE_URL.rstrip('/')}/player_api.php?username={USERNAME}&password={PASSWORD}&{endpoint}"
-    log(f"API: {url}")
+    cached = api_cached(endpoint)
+    if cached is not None:
+        return cached
     try:
-        r = safe_requests_get(url)
-        return r.json()
-    except requests.RequestException as e:
+        return fetch_json(endpoint)
+    except http_errors() as e:
         log(f"Erro na requisição: {e}", xbmc.LOGERROR)
+        data = api_offline(endpoint)
+        if data is not None:
+            return data
         show_dialog("Erro", f"Falha na API: {e}")
     except ValueError:
-        log(f"Resposta inválida (não-JSON) da API: {url}", xbmc.LOGERROR)
+        log(f"Resposta inválida (não-JSON) da API: {endpoint}", xbmc.LOGERROR)
         show_dialog("Erro", "Resposta da API não é JSON válido.")
     return None
 
+def api_offline(endpoint):
+    """Host fora do ar: a última resposta salva, de qualquer idade, serve."""
+    if api_cache_ttl(endpoint) is None:
+        return None
+    data, age = api_cache_entry(endpoint)
+    if data is not None:
+        log(f"API (cache de {int(age)}s, servidor indisponível): {endpoint}", xbmc.LOGWARNING)
+        show_notification("Servidor indisponível", "Exibindo a última lista salva.",
+                          xbmcgui.NOTIFICATION_WARNING)
+    return data
+
+def get_json_iter(endpoint):
+    """get_json() para respostas em lista: iterador decodificado durante o download."""
+    started = time.perf_counter()
+    try:
+        return _get_json_iter(endpoint)
+    finally:
+        trace_add('get_json_iter', started)
+
+def _get_json_iter(endpoint):
+    if not all([BASE_URL, USERNAME, PASSWORD]):
+        log("Credenciais incompletas.", xbmc.LOGERROR)
+        show_dialog("Erro", "Configure host, usuário e senha nas configurações.")
+        return iter(())
+    cached = api_cached(endpoint)
+    if cached is not None:
+        return iter(cached if isinstance(cached, list) else ())
+    items = api_iter(endpoint)
+    try:
+        # conexão e status HTTP falham aqui, antes do primeiro item
+        first = next(items)
+    except StopIteration:
+        return iter(())
+    except http_errors() as e:
+        log(f"Erro na requisição: {e}", xbmc.LOGERROR)
+        data = api_offline(endpoint)
+        if data is not None:
+            return iter(data)
+        show_dialog("Erro", f"Falha na API: {e}")
+        return iter(())
+    except ValueError:
+        log(f"Resposta inválida (não-JSON) da API: {endpoint}", xbmc.LOGERROR)
+        show_dialog("Erro", "Resposta da API não é JSON válido.")
+        return iter(())
+    return _api_iter_guard(endpoint, itertools.chain([first], items))
+
+def _api_iter_guard(endpoint, items):
+    # falha no meio do corpo: fica com o que já chegou
+    try:
+        yield from items
+    except (http_errors(), ValueError) as e:
+        log(f"Resposta interrompida ({endpoint}): {e}", xbmc.LOGERROR)
+        show_notification("Erro", "Lista incompleta: falha ao baixar do servidor.",
+                          xbmcgui.NOTIFICATION_ERROR)
+
+# =========================
+# Catálogo local (SQLite)
+# =========================
+def catalog_connect():
+    conn = sqlite3.connect(CATALOG_DB_PATH, timeout=30)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=NORMAL')
+    if conn.execute('PRAGMA user_version').fetchone()[0] != CATALOG_SCHEMA:
+        with conn:
+            for table in ('streams', 'stream_categories', 'search_terms', 'catalog_meta'):
+                conn.execute(f'DROP TABLE IF EXISTS {table}')
+            conn.execute(f'PRAGMA user_version = {CATALOG_SCHEMA}')
+    conn.execute('CREATE TABLE IF NOT EXISTS streams (kind TEXT, id INTEGER, num INTEGER, name TEXT, folded TEXT, '
+                 'icon TEXT, epg_channel_id TEXT, stream_type TEXT, stamp INTEGER, sig INTEGER, PRIMARY KEY (kind, id))')
+    conn.execute('CREATE TABLE IF NOT EXISTS stream_categories (kind TEXT, category_id TEXT, id INTEGER)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_stream_categories ON stream_categories (kind, category_id)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_stream_categories_id ON stream_categories (kind, id)')
+    # índice de pesquisa: cada palavra (sem acentos, minúscula) de cada título
+    conn.execute('CREATE TABLE IF NOT EXISTS search_terms (term TEXT, kind TEXT, id INTEGER, '
+                 'PRIMARY KEY (term, kind, id)) WITHOUT ROWID')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_search_terms_id ON search_terms (kind, id)')
+    conn.execute('CREATE TABLE IF NOT EXISTS catalog_meta (kind TEXT PRIMARY KEY, fingerprint TEXT, '
+                 'synced_at REAL, total INTEGER)')
+    return conn
+
+def search_fold(text):
+    """Texto de pesquisa sem acentos e minúsculo ('Ação: Vol.2' -> 'acao vol 2')."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(c for c in text if not unicodedata.combining(c)).casefold()
+    return ' '.join(''.join(c if c.isalnum() else ' ' for c in text).split())
+
+def _catalog_int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+def _catalog_row(kind, s, position):
+    """Converte um item da API em (linha, categorias); None se não tiver id."""
+    sid = _catalog_int(s.get('series_id' if kind == 'series' else 'stream_id'), None)
+    if sid is None:
+        return None
+    if kind == 'series':
+        info = s.get('info', {}) or {}
+        icon = info.get('cover_big') or info.get('movie_image', '')
+        if not icon:
+            icon = s.get('cover') if s.get('cover') else (s.get('backdrop_path') or [''])[0]
+        stamp = _catalog_int(s.get('last_modified'))
+    else:
+        icon = s.get('stream_icon') or ''
+        stamp = _catalog_int(s.get('added'))
+    categories = [str(c) for c in (s.get('category_ids') or []) if c is not None]
+    if s.get('category_id') is not None and str(s['category_id']) not in categories:
+        categories.insert(0, str(s['category_id']))
+    num = _catalog_int(s.get('num'), position)
+    name = html.unescape(s.get('name') or 'Sem nome')
+    epg_channel_id = s.get('epg_channel_id') or None
+    stream_type = s.get('stream_type', '')
+    # stamp (added/last_modified) é a marca de mudança da API; os demais campos
+    # entram na assinatura porque renomear/mover um canal não altera `added`
+    sig = zlib.crc32(repr((num, name, icon, epg_channel_id, stream_type, stamp, categories)).encode('utf-8'))
+    return (kind, sid, num, name, search_fold(name), icon, epg_channel_id, stream_type, stamp, sig), categories
+
+def catalog_sync_iter(endpoint, data):
+    """Sincroniza a lista completa `data` com o catálogo, repassando cada item."""
+    kind = CATALOG_KINDS[endpoint]
+    started = time.time()
+    seen = set()
+    added = changed = 0
+    removed = []
+    batch = []
+    conn = None
+
+    def flush():
+        # cada lote na sua transação: outro processo não espera o download inteiro
+        keys = [(kind, row[1]) for row, _ in batch]
+        with conn:
+            conn.executemany('DELETE FROM stream_categories WHERE kind = ? AND id = ?', keys)
+            conn.executemany('DELETE FROM search_terms WHERE kind = ? AND id = ?', keys)
+            conn.executemany('INSERT OR REPLACE INTO streams VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                             [row for row, _ in batch])
+            conn.executemany('INSERT INTO stream_categories VALUES (?, ?, ?)',
+                             [(kind, c, row[1]) for row, cats in batch for c in cats])
+            conn.executemany('INSERT INTO search_terms VALUES (?, ?, ?)',
+                             [(term, kind, row[1]) for row, _ in batch for term in set(row[4].split())])
+        del batch[:]
+
+    def failed(e):
+        # catálogo ocupado/corrompido: a listagem segue, só sem sincronizar
+        log(f"Catálogo {kind}: sincronização abandonada: {e}", xbmc.LOGWARNING)
+        if conn is not None:
+            conn.close()
+
+    try:
+        ensure_profile_dir()
+        conn = catalog_connect()
+        meta = conn.execute('SELECT fingerprint FROM catalog_meta WHERE kind = ?', (kind,)).fetchone()
+        if meta and meta[0] != fingerprint():
+            with conn:
+                conn.execute('DELETE FROM streams WHERE kind = ?', (kind,))
+                conn.execute('DELETE FROM stream_categories WHERE kind = ?', (kind,))
+                conn.execute('DELETE FROM search_terms WHERE kind = ?', (kind,))
+        existing = dict(conn.execute('SELECT id, sig FROM streams WHERE kind = ?', (kind,)))
+    except sqlite3.Error as e:
+        failed(e)
+        yield from data
+        return
+
+    try:
+        for position, s in enumerate(data):
+            parsed = _catalog_row(kind, s, position) if conn is not None and isinstance(s, dict) else None
+            if parsed is not None and parsed[0][1] not in seen:
+                row = parsed[0]
+                seen.add(row[1])
+                if existing.get(row[1]) != row[-1]:
+                    if row[1] in existing:
+                        changed += 1
+                    else:
+                        added += 1
+                    batch.append(parsed)
+                    if len(batch) >= CATALOG_BATCH:
+                        try:
+                            flush()
+                        except sqlite3.Error as e:
+                            failed(e)
+                            conn = None
+            yield s
+        if conn is None:
+            return
+
+        # lista completa: só agora os itens que sumiram são apagados
+        removed = [(kind, sid) for sid in existing if sid not in seen]
+        try:
+            flush()
+            with conn:
+                conn.executemany('DELETE FROM streams WHERE kind = ? AND id = ?', removed)
+                conn.executemany('DELETE FROM stream_categories WHERE kind = ? AND id = ?', removed)
+                conn.executemany('DELETE FROM search_terms WHERE kind = ? AND id = ?', removed)
+                conn.execute('INSERT OR REPLACE INTO catalog_meta VALUES (?, ?, ?, ?)',
+                             (kind, fingerprint(), time.time(), len(seen)))
+        except sqlite3.Error as e:
+            failed(e)
+            conn = None
+            return
+    finally:
+        if conn is not None:
+            conn.close()
+
+    # a lista completa agora mora no catálogo; o JSON antigo só ocupa espaço
+    try:
+        os.remove(api_cache_path(f"action={endpoint}"))
+    except OSError:
+        pass
+    log(f"Catálogo {kind}: {len(seen)} itens, {added} novos, {changed} alterados, "
+        f"{len(removed)} removidos em {time.time() - started:.2f}s", xbmc.LOGINFO)
+
+def catalog_sync(endpoint, data):
+    for _ in catalog_sync_iter(endpoint, data):
+        pass
+
+def _catalog_api_row(kind, row):
+    sid, name, icon, epg_channel_id, stream_type = row
+    if kind == 'series':
+        return {'series_id': sid, 'name': name, 'cover': icon}
+    return {'stream_id': sid, 'name': name, 'stream_icon': icon, 'epg_channel_id': epg_channel_id,
+            'stream_type': stream_type}
+
+def catalog_ready(conn, endpoint):
+    """True se a lista de `endpoint` está sincronizada para esta conta."""
+    kind = CATALOG_KINDS[endpoint]
+    meta = conn.execute('SELECT fingerprint, synced_at FROM catalog_meta WHERE kind = ?', (kind,)).fetchone()
+    if not meta or meta[0] != fingerprint():
+        return False
+    age = time.time() - meta[1]
+    if age >= API_CACHE_STALE_MAX:
+        return False
+    if age >= API_CACHE_TTLS[endpoint]:
+        log(f"Catálogo {kind} vencido há {int(age - API_CACHE_TTLS[endpoint])}s, renovando")
+        api_refresh_async(f"action={endpoint}")
+    return True
+
+def catalog_items(endpoint, category_id=None, offset=0, limit=0):
+    """Itens do catálogo no formato da API (categoria e fatia opcionais), ou None."""
+    kind = CATALOG_KINDS.get(endpoint)
+    if kind is None or not os.path.exists(CATALOG_DB_PATH):
+        return None
+    try:
+        conn = catalog_connect()
+    except sqlite3.Error as e:
+        log(f"Falha ao abrir catálogo: {e}", xbmc.LOGERROR)
+        return None
+    try:
+        if not catalog_ready(conn, endpoint):
+            conn.close()
+            return None
+        columns = 's.id, s.name, s.icon, s.epg_channel_id, s.stream_type'
+        if category_id:
+            rows = conn.execute(
+                f'SELECT {columns} FROM stream_categories c JOIN streams s ON s.kind = c.kind AND s.id = c.id '
+                'WHERE c.kind = ? AND c.category_id = ? ORDER BY s.num, s.id LIMIT ? OFFSET ?',
+                (kind, str(category_id), limit or -1, offset))
+        else:
+            rows = conn.execute(f'SELECT {columns} FROM streams s WHERE s.kind = ? ORDER BY s.num, s.id '
+                                'LIMIT ? OFFSET ?', (kind, limit or -1, offset))
+    except sqlite3.Error as e:
+        log(f"Falha ao consultar catálogo: {e}", xbmc.LOGERROR)
+        conn.close()
+        return None
+    return _catalog_iter(conn, kind, rows)
+
+def _catalog_iter(conn, kind, rows):
+    try:
+        for row in rows:
+            yield _catalog_api_row(kind, row)
+    finally:
+        conn.close()
+
+def _catalog_fetch(conn, columns, keys):
+    """Linhas (kind, id, <columns>) das chaves (kind, id) dadas."""
+    by_kind = {}
+    for kind, sid in keys:
+        by_kind.setdefault(kind, []).append(sid)
+    for kind, ids in by_kind.items():
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            yield from conn.execute(f'SELECT kind, id, {columns} FROM streams WHERE kind = ? '
+                                    f'AND id IN ({",".join("?" * len(chunk))})', [kind] + chunk)
+
+def _catalog_match(conn, tokens, kinds, substring):
+    """{(kind, id): pontos} dos itens que casam com todas as palavras."""
+    scores = None
+    for token in set(tokens):
+        matched = {}
+        for term, kind, sid in conn.execute('SELECT term, kind, id FROM search_terms WHERE term >= ? AND term < ?',
+                                            (token, token + '\U0010ffff')):
+            if kind in kinds:
+                score = 3 if term == token else 2
+                if matched.get((kind, sid), 0) < score:
+                    matched[(kind, sid)] = score
+        if substring:
+            for kind, sid in conn.execute('SELECT kind, id FROM streams WHERE instr(folded, ?) > 0', (token,)):
+                if kind in kinds:
+                    matched.setdefault((kind, sid), 1)
+        if scores is None:
+            scores = matched
+        else:
+            scores = {key: score + matched[key] for key, score in scores.items() if key in matched}
+        if not scores:
+            break
+    return scores or {}
+
+def catalog_search(query, endpoints):
+    """([(endpoint, item)] por relevância, endpoints pesquisados) do catálogo."""
+    folded_query = search_fold(query)
+    tokens = folded_query.split()
+    if not tokens or not os.path.exists(CATALOG_DB_PATH):
+        return [], []
+    try:
+        conn = catalog_connect()
+    except sqlite3.Error as e:
+        log(f"Falha ao abrir catálogo: {e}", xbmc.LOGERROR)
+        return [], []
+    try:
+        searched = [ep for ep in endpoints if catalog_ready(conn, ep)]
+        kinds = {CATALOG_KINDS[ep]: ep for ep in searched}
+        # trechos no meio das palavras só são procurados se as palavras
+        # inteiras não bastarem para encher a lista
+        scores = _catalog_match(conn, tokens, kinds, substring=False)
+        if len(scores) < SEARCH_LIMIT:
+            scores = _catalog_match(conn, tokens, kinds, substring=True)
+        if not scores:
+            return [], searched
+
+        # ordena com colunas leves e só carrega os itens que serão exibidos
+        order = list(kinds)
+        if len(scores) > 5000:
+            rows = (r for r in conn.execute('SELECT kind, id, num, folded FROM streams') if (r[0], r[1]) in scores)
+        else:
+            rows = _catalog_fetch(conn, 'num, folded', scores)
+        ranked = []
+        for kind, sid, num, folded in rows:
+            ranked.append(((-scores[(kind, sid)], not folded.startswith(folded_query), folded_query not in folded,
+                            len(folded), order.index(kind), num), kind, sid))
+        top = heapq.nsmallest(SEARCH_LIMIT, ranked)
+        found = {}
+        for row in _catalog_fetch(conn, 'name, icon, epg_channel_id, stream_type', [(kind, sid) for _, kind, sid in top]):
+            found[row[:2]] = _catalog_api_row(row[0], row[1:])
+        return [(kinds[kind], found[(kind, sid)]) for _, kind, sid in top], searched
+    except sqlite3.Error as e:
+        log(f"Falha ao pesquisar no catálogo: {e}", xbmc.LOGERROR)
+        return [], []
+    finally:
+        conn.close()
+
 # =========================
 # EPG (cache + parsing)
 # =========================
@@ -126,12 +1149,15 @@ def epg_meta_load():
 
 def epg_meta_save(meta):
     try:
-        with open(EPG_META_PATH, 'w', encoding='utf-8') as f:
+        tmp_path = EPG_META_PATH + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
             json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, EPG_META_PATH)
     except Exception as e:
         log(f"Falha ao salvar meta EPG: {e}", xbmc.LOGERROR)
 
-def epg_should_refresh():
+def epg_should_refresh(defer_to_service=True):
+    """True se o EPG precisa ser baixado; por TTL, cede ao serviço com `defer_to_service`."""
     meta = epg_meta_load()
     fp = fingerprint()
     meta_fp = meta.get('fingerprint')
@@ -142,19 +1168,79 @@ def epg_should_refresh():
     if not os.path.exists(EPG_XML_PATH):
         log("EPG não existe. Baixando.")
         return True
+    if meta.get('retention') != [EPG_PAST_HOURS, EPG_FUTURE_HOURS]:
+        log("Janela de retenção do EPG mudou. Renovando.")
+        return True
     if (time.time() - fetched_at) >= EPG_TTL:
+        if defer_to_service and service_alive():
+            log("EPG expirado; o serviço vai renovar em segundo plano.")
+            return False
         log("EPG expirado. Renovando.")
         return True
     return False
 
 def epg_download():
     ensure_profile_dir()
-    url = f"{BASE_URL.rstrip('/')}/xmltv.php?username={USERNAME}&password={PASSWORD}"
+    if not acquire_lock(EPG_LOCK_PATH):
+        log("EPG já está sendo baixado por outro processo.")
+        return
+    try:
+        _epg_download()
+    finally:
+        release_lock(EPG_LOCK_PATH)
+
+def _epg_download():
+    url = f"{api_base()}/xmltv.php?username={USERNAME}&password={PASSWORD}"
     log(f"Baixando EPG: {url}")
-    r = safe_requests_get(url)
-    with open(EPG_XML_PATH, 'w', encoding='utf-8') as f:
-        f.write(r.text)
-    epg_meta_save({'fingerprint': fingerprint(), 'fetched_at': time.time()})
+
+    meta = epg_meta_load()
+    headers = dict(HEADERS)
+    headers['Accept-Encoding'] = 'gzip'
+    # requisição condicional: só vale se o arquivo local é do mesmo servidor/conta
+    # e foi recortado com a mesma janela de retenção
+    retention = [EPG_PAST_HOURS, EPG_FUTURE_HOURS]
+    if (meta.get('fingerprint') == fingerprint() and meta.get('retention') == retention
+            and os.path.exists(EPG_XML_PATH)):
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+
+    r = safe_requests_get(url, headers=headers, stream=True)
+    try:
+        if r.status_code == 304:
+            log("EPG não mudou no servidor (304).")
+            meta['fetched_at'] = time.time()
+            epg_meta_save(meta)
+            return
+
+        # grava em pedaços num .tmp; o guia atual só é trocado após a indexação
+        try:
+            with open(EPG_DOWNLOAD_PATH, 'wb') as f:
+                for chunk in trace_chunks('epg_download', r.iter_content(chunk_size=EPG_CHUNK_SIZE)):
+                    if chunk:
+                        f.write(chunk)
+        except Exception:
+            if os.path.exists(EPG_DOWNLOAD_PATH):
+                os.remove(EPG_DOWNLOAD_PATH)
+            raise
+    finally:
+        r.close()
+
+    try:
+        epg_build_index(EPG_DOWNLOAD_PATH, retained_path=EPG_XML_PATH)
+    finally:
+        os.remove(EPG_DOWNLOAD_PATH)
+    if os.path.exists(EPG_LEGACY_XML_PATH):
+        os.remove(EPG_LEGACY_XML_PATH)
+
+    epg_meta_save({
+        'fingerprint': fingerprint(),
+        'fetched_at': time.time(),
+        'etag': r.headers.get('ETag'),
+        'last_modified': r.headers.get('Last-Modified'),
+        'retention': retention,
+    })
 
 def parse_xmltv_time(ts):
     """Converte timestamp XMLTV para UNIX timestamp. Retorna agora() se inválido."""
@@ -187,12 +1273,124 @@ def parse_xmltv_time(ts):
     epoch = calendar.timegm(dt.timetuple()) - offset_secs
     return epoch if epoch > 0 else int(time.time())
 
+def _xmltv_offset(rest):
+    """Fuso horário ('+0300', '-0130', ...) em segundos, memorizado por texto."""
+    offset_secs = _XMLTV_OFFSET_CACHE.get(rest)
+    if offset_secs is None:
+        offset_secs = 0
+        compact = rest.strip().replace(' ', '')
+        if compact.startswith(('+', '-')) and len(compact) >= 5:
+            try:
+                sign = 1 if compact[0] == '+' else -1
+                offset_secs = sign * (int(compact[1:3]) * 3600 + int(compact[3:5]) * 60)
+            except Exception:
+                offset_secs = 0
+        _XMLTV_OFFSET_CACHE[rest] = offset_secs
+    return offset_secs
+
+def parse_xmltv_time_fast(ts):
+    """Mesmo resultado de parse_xmltv_time, sem strptime."""
+    if not ts:
+        return parse_xmltv_time(ts)
+    ts = ts.strip()
+    day = _XMLTV_DAY_CACHE.get(ts[:8])
+    if day is None:
+        if len(ts) < 14 or not (ts[:8].isascii() and ts[:8].isdigit()):
+            return parse_xmltv_time(ts)
+        try:
+            y, mo, d = int(ts[0:4]), int(ts[4:6]), int(ts[6:8])
+            datetime(y, mo, d)
+        except ValueError:
+            return parse_xmltv_time(ts)
+        day = calendar.timegm((y, mo, d, 0, 0, 0, 0, 0, 0))
+        _XMLTV_DAY_CACHE[ts[:8]] = day
+
+    clock = ts[8:14]
+    if len(clock) < 6 or not (clock.isascii() and clock.isdigit()):
+        return parse_xmltv_time(ts)
+    hh, rem = divmod(int(clock), 10000)
+    mm, ss = divmod(rem, 100)
+    if hh > 23 or mm > 59 or ss > 59:
+        return parse_xmltv_time(ts)
+
+    epoch = day + hh * 3600 + mm * 60 + ss
+    if len(ts) > 14:
+        epoch -= _xmltv_offset(ts[14:])
+    return epoch if epoch > 0 else int(time.time())
+
 def normalize_epg_channel_id(cid):
     if not cid:
         return ''
     return cid.strip().lower().replace('&amp;', '&')
 
+def epg_retention_window(now=None):
+    """Intervalo (de, até) de programas que vale a pena guardar."""
+    if now is None:
+        now = int(time.time())
+    return now - EPG_PAST_HOURS * 3600, now + EPG_FUTURE_HOURS * 3600
+
+def epg_open_xml(path):
+    if path.endswith('.gz'):
+        return lazy_import('gzip').open(path, 'rb')
+    return open(path, 'rb')
+
+def epg_iter_xmltv(source, window=None):
+    """Gera ('channel', ...) e ('programme', ...) do XMLTV via iterparse, opcionalmente na `window`."""
+    context = lazy_import('xml.etree.ElementTree').iterparse(source, events=('start', 'end'))
+    root = None
+    for event, elem in context:
+        if event == 'start':
+            if root is None:
+                root = elem
+            continue
+
+        tag = elem.tag
+        if tag == 'channel':
+            cid = normalize_epg_channel_id(elem.get('id'))
+            dn = (elem.findtext('display-name') or '').strip()
+            yield ('channel', cid, dn)
+        elif tag == 'programme':
+            cid = normalize_epg_channel_id(elem.get('channel'))
+
+            # usa start_timestamp e stop_timestamp se existirem
+            try:
+                start = int(elem.get('start_timestamp'))
+            except (TypeError, ValueError):
+                start = parse_xmltv_time_fast(elem.get('start'))
+
+            try:
+                stop = int(elem.get('stop_timestamp') or elem.get('end_timestamp'))
+            except (TypeError, ValueError):
+                stop = parse_xmltv_time_fast(elem.get('stop') or elem.get('end'))
+
+            # garante start < end
+            if stop <= start:
+                stop = start + 3600
+
+            if window is None or (stop > window[0] and start < window[1]):
+                title = (elem.findtext('title') or '').strip()
+                desc = (elem.findtext('desc') or '').strip()
+                yield ('programme', cid, start, stop, title, desc)
+        else:
+            continue
+
+        # descarta o que já foi lido: memória limitada a um elemento por vez
+        elem.clear()
+        if root is not None:
+            root.clear()
+
+def epg_empty():
+    return {'channels': {}, 'starts': {}, 'ends': {}, 'titles': {}, 'desc_refs': {}, 'desc_file': None}
+
 def epg_load_parsed():
+    """Carrega o guia em memória de forma compacta (sem o índice SQLite)."""
+    started = time.perf_counter()
+    try:
+        return _epg_load_parsed()
+    finally:
+        trace_add('epg_load_parsed', started)
+
+def _epg_load_parsed():
     global _EPG_PARSED
 
     if epg_should_refresh():
@@ -200,135 +1398,442 @@ def epg_load_parsed():
             epg_download()
         except Exception as e:
             log(f"Falha ao baixar EPG: {e}", xbmc.LOGERROR)
-            _EPG_PARSED = {'channels': {}, 'progs': {}}
+            _EPG_PARSED = epg_empty()
             return _EPG_PARSED
 
     if not os.path.exists(EPG_XML_PATH):
-        _EPG_PARSED = {'channels': {}, 'progs': {}}
+        _EPG_PARSED = epg_empty()
         return _EPG_PARSED
 
     try:
-        tree = ET.parse(EPG_XML_PATH)
-        root = tree.getroot()
+        epg = epg_empty()
+        channels, starts, ends, titles, desc_refs = (
+            epg['channels'], epg['starts'], epg['ends'], epg['titles'], epg['desc_refs'])
+        desc_file = lazy_import('tempfile').TemporaryFile(dir=PROFILE_DIR)
+        epg['desc_file'] = desc_file
+        offset = 0
+
+        with epg_open_xml(EPG_XML_PATH) as source:
+            for entry in epg_iter_xmltv(source, epg_retention_window()):
+                if entry[0] == 'channel':
+                    channels[entry[1]] = entry[2]
+                    continue
+                _, cid, start, stop, title, desc = entry
+                if cid not in starts:
+                    starts[cid] = array('q')
+                    ends[cid] = array('q')
+                    titles[cid] = []
+                    desc_refs[cid] = array('q')
+                starts[cid].append(start)
+                ends[cid].append(stop)
+                titles[cid].append(sys.intern(title))
+                raw = desc.encode('utf-8')
+                desc_file.write(raw)
+                desc_refs[cid].append(offset)
+                desc_refs[cid].append(len(raw))
+                offset += len(raw)
+        desc_file.flush()
+
+        # o XMLTV costuma vir ordenado; só reordena os canais que não vieram
+        for cid, arr in starts.items():
+            if all(arr[i] <= arr[i + 1] for i in range(len(arr) - 1)):
+                continue
+            order = sorted(range(len(arr)), key=arr.__getitem__)
+            refs = desc_refs[cid]
+            starts[cid] = array('q', (arr[i] for i in order))
+            ends[cid] = array('q', (ends[cid][i] for i in order))
+            titles[cid] = [titles[cid][i] for i in order]
+            desc_refs[cid] = array('q', (x for i in order for x in (refs[2 * i], refs[2 * i + 1])))
+
+        _EPG_PARSED = epg
+        log(f"EPG carregado: canais={len(channels)}, programas={sum(len(v) for v in starts.values())}")
+    except Exception as e:
+        log(f"Erro parseando EPG: {e}", xbmc.LOGERROR)
+        _EPG_PARSED = epg_empty()
 
-        channels = {}
-        progs = {}
+    return _EPG_PARSED
 
-        for c in root.findall(".//channel"):
-            cid = normalize_epg_channel_id(c.get('id'))
-            dn = (c.findtext('display-name') or '').strip()
-            channels[cid] = dn
+def _epg_programme(epg, cid, i):
+    """Monta o dict do programa i do canal, lendo a descrição do disco."""
+    if i is None:
+        return None
+    desc = ''
+    length = epg['desc_refs'][cid][2 * i + 1]
+    if length:
+        f = epg['desc_file']
+        f.seek(epg['desc_refs'][cid][2 * i])
+        desc = f.read(length).decode('utf-8', errors='replace')
+    return {'start': epg['starts'][cid][i], 'end': epg['ends'][cid][i],
+            'title': epg['titles'][cid][i], 'desc': desc}
+
+def epg_xmltv_time(ts):
+    return time.strftime('%Y%m%d%H%M%S +0000', time.gmtime(ts))
+
+def epg_build_index(xml_path=EPG_XML_PATH, retained_path=None):
+    """Gera o epg.db (e o guia recortado em `retained_path`) numa passada pelo XMLTV."""
+    tmp_path = EPG_DB_PATH + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    retained_tmp = retained_path + '.tmp' if retained_path else None
+
+    started = time.time()
+    total = 0
+    conn = sqlite3.connect(tmp_path)
+    saxutils = lazy_import('xml.sax.saxutils')
+    escape, quoteattr = saxutils.escape, saxutils.quoteattr
+    out = lazy_import('gzip').open(retained_tmp, 'wt', encoding='utf-8', compresslevel=6) if retained_tmp else None
+    try:
+        conn.execute('PRAGMA journal_mode=OFF')
+        conn.execute('PRAGMA synchronous=OFF')
+        conn.execute('CREATE TABLE channels (id TEXT PRIMARY KEY, name TEXT)')
+        conn.execute('CREATE TABLE programmes (channel TEXT, start INTEGER, stop INTEGER, title TEXT, description TEXT)')
+        if out:
+            out.write('<?xml version="1.0" encoding="utf-8"?>\n<tv>\n')
 
-        for p in root.findall(".//programme"):
-            cid = normalize_epg_channel_id(p.get('channel'))
+        channels = {}
+        batch = []
+        with epg_open_xml(xml_path) as source:
+            for entry in epg_iter_xmltv(source, epg_retention_window()):
+                if entry[0] == 'channel':
+                    channels[entry[1]] = entry[2]
+                    if out:
+                        out.write(f'<channel id={quoteattr(entry[1])}><display-name>{escape(entry[2])}</display-name></channel>\n')
+                    continue
+                _, cid, start, stop, title, desc = entry
+                batch.append((cid, start, stop, title, desc))
+                if out:
+                    out.write(
+                        f'<programme channel={quoteattr(cid)} start="{epg_xmltv_time(start)}" stop="{epg_xmltv_time(stop)}" '
+                        f'start_timestamp="{start}" stop_timestamp="{stop}">'
+                        f'<title>{escape(title)}</title><desc>{escape(desc)}</desc></programme>\n')
+                if len(batch) >= 5000:
+                    conn.executemany('INSERT INTO programmes VALUES (?, ?, ?, ?, ?)', batch)
+                    total += len(batch)
+                    batch = []
+        if batch:
+            conn.executemany('INSERT INTO programmes VALUES (?, ?, ?, ?, ?)', batch)
+            total += len(batch)
+        conn.executemany('INSERT OR REPLACE INTO channels VALUES (?, ?)', channels.items())
+
+        # programas não se sobrepõem: ordenar por fim equivale a ordenar por início
+        conn.execute('CREATE INDEX idx_programmes_channel_stop ON programmes (channel, stop)')
+        conn.commit()
+        if out:
+            out.write('</tv>\n')
+            out.close()
+    except Exception:
+        conn.close()
+        os.remove(tmp_path)
+        if out:
+            out.close()
+            os.remove(retained_tmp)
+        raise
+    conn.close()
+
+    if retained_tmp:
+        os.replace(retained_tmp, retained_path)
+    os.replace(tmp_path, EPG_DB_PATH)
+    log(f"Índice EPG gerado: programas={total} em {time.time() - started:.1f}s")
+
+def epg_open_index():
+    """Abre o índice EPG, baixando-o se preciso; None se não puder ser usado."""
+    started = time.perf_counter()
+    try:
+        return _epg_open_index()
+    finally:
+        trace_add('epg_open_index', started)
 
-            # usa start_timestamp e stop_timestamp se existirem
-            try:
-                start = int(p.get('start_timestamp'))
-            except (TypeError, ValueError):
-                start = parse_xmltv_time(p.get('start'))
+def _epg_open_index():
+    if epg_should_refresh():
+        try:
+            epg_download()
+        except Exception as e:
+            log(f"Falha ao baixar EPG: {e}", xbmc.LOGERROR)
+            if not os.path.exists(EPG_DB_PATH):
+                return epg_empty()
 
+    if os.path.exists(EPG_XML_PATH):
+        stale = (not os.path.exists(EPG_DB_PATH)
+                 or os.path.getmtime(EPG_DB_PATH) < os.path.getmtime(EPG_XML_PATH))
+        if stale:
             try:
-                stop = int(p.get('stop_timestamp') or p.get('end_timestamp'))
-            except (TypeError, ValueError):
-                stop = parse_xmltv_time(p.get('stop') or p.get('end'))
+                epg_build_index()
+            except Exception as e:
+                log(f"Falha ao indexar EPG: {e}", xbmc.LOGERROR)
+                return None
 
-            # garante start < end
-            if stop <= start:
-                stop = start + 3600
+    if not os.path.exists(EPG_DB_PATH):
+        return epg_empty()
 
-            title = (p.findtext('title') or '').strip()
-            desc = (p.findtext('desc') or '').strip()
+    try:
+        return {'db': sqlite3.connect(EPG_DB_PATH)}
+    except sqlite3.Error as e:
+        log(f"Falha ao abrir índice EPG: {e}", xbmc.LOGERROR)
+        return None
+
+def _epg_pick_current_next(starts, ends, now):
+    """Índices (atual, próximo) nas listas ordenadas starts/ends via bisect."""
+    i = bisect.bisect_right(starts, now) - 1
+    current = i if i >= 0 and ends[i] > now else None
+    nextp = i + 1 if i + 1 < len(starts) else None
+    return current, nextp
 
-            if cid not in progs:
-                progs[cid] = []
+def epg_lookup_many(epg_channel_ids, epg, now=None):
+    """{cid normalizado: (atual, próximo)} de vários canais no instante `now`."""
+    if now is None:
+        now = int(time.time())
+    db = epg.get('db')
+    result = {}
+    for raw_cid in epg_channel_ids:
+        cid = normalize_epg_channel_id(raw_cid)
+        if not cid or cid in result:
+            continue
+
+        if db is not None:
+            # consulta só o canal pedido: atual (se houver) e o seguinte
+            rows = db.execute(
+                'SELECT start, stop, title, description FROM programmes '
+                'WHERE channel = ? AND stop > ? ORDER BY stop LIMIT 2', (cid, now)).fetchall()
+            progs = [{'start': r[0], 'end': r[1], 'title': r[2], 'desc': r[3]} for r in rows]
+            if progs and progs[0]['start'] <= now:
+                result[cid] = (progs[0], progs[1] if len(progs) > 1 else None)
+            else:
+                result[cid] = (None, progs[0] if progs else None)
+            continue
 
-            progs[cid].append({'start': start, 'end': stop, 'title': title, 'desc': desc})
+        ch_starts = epg['starts'].get(cid)
+        if not ch_starts:
+            result[cid] = (None, None)
+            continue
+        i_cur, i_next = _epg_pick_current_next(ch_starts, epg['ends'][cid], now)
+        result[cid] = (_epg_programme(epg, cid, i_cur), _epg_programme(epg, cid, i_next))
+    return result
 
-        for cid, arr in progs.items():
-            arr.sort(key=lambda x: x['start'])
+def epg_lookup_current_next(epg_channel_id, epg, now=None):
+    cid = normalize_epg_channel_id(epg_channel_id)
+    return epg_lookup_many([cid], epg, now).get(cid, (None, None))
 
-        _EPG_PARSED = {'channels': channels, 'progs': progs}
-        log(f"EPG carregado: canais={len(channels)}, programas={sum(len(v) for v in progs.values())}")
+# =========================
+# EPG por canal (get_short_epg)
+# =========================
+def epg_short_cache_load():
+    try:
+        with open(EPG_SHORT_CACHE_PATH, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+        if cache.get('fingerprint') == fingerprint():
+            return cache
+    except Exception:
+        pass
+    return {'fingerprint': fingerprint(), 'channels': {}}
+
+def epg_short_cache_save(cache):
+    now = time.time()
+    # descarta canais que não são consultados há mais de um dia
+    cache['channels'] = dict((sid, entry) for sid, entry in cache.get('channels', {}).items()
+                             if now - entry.get('fetched_at', 0) < 24 * 3600)
+    try:
+        ensure_profile_dir()
+        tmp_path = EPG_SHORT_CACHE_PATH + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp_path, EPG_SHORT_CACHE_PATH)
     except Exception as e:
-        log(f"Erro parseando EPG: {e}", xbmc.LOGERROR)
-        _EPG_PARSED = {'channels': {}, 'progs': {}}
+        log(f"Falha ao salvar cache do EPG por canal: {e}", xbmc.LOGERROR)
 
-    return _EPG_PARSED
+def _b64_text(value):
+    try:
+        return base64.b64decode(value).decode('utf-8', errors='replace').strip()
+    except Exception:
+        return (value or '').strip()
 
-def epg_lookup_current_next(epg_channel_id, epg):
-    #epg = epg_load_parsed()
-    cid = normalize_epg_channel_id(epg_channel_id)
-    now = int(time.time())
-    
-    plist = epg['progs'].get(cid, [])
-    # log(f'CID EPG: {cid}')
-    # log(f'LISTA DO CANAL: {plist}')    
-    current, nextp = None, None
-    
-    for i, pr in enumerate(plist):
-        start = pr.get('start') or now
-        end = pr.get('end') or (start + 3600)
-        if end <= start:
-            end = start + 3600
-        pr['start'] = start
-        pr['end'] = end
-        
-        if start <= now < end:
-            current = pr
-            if i + 1 < len(plist):
-                nextp = plist[i + 1]
-            break
-        if start > now:
-            nextp = pr
-            if i - 1 >= 0 and plist[i-1]['end'] > now:
-                current = plist[i-1]
-            break
+def epg_fetch_short(stream_id):
+    """EPG curto do canal: programas ordenados, None em falha ou False se não suportado."""
+    url = (f"{api_base()}/player_api.php?username={USERNAME}&password={PASSWORD}"
+           f"&action=get_short_epg&stream_id={stream_id}&limit={EPG_SHORT_LIMIT}")
+    try:
+        data = safe_requests_get(url, timeout=10).json()
+    except Exception as e:
+        log(f"EPG curto indisponível para {stream_id}: {e}")
+        return None
+    if not isinstance(data, dict) or not isinstance(data.get('epg_listings'), list):
+        return False
 
-    return current, nextp
+    progs = []
+    for ep in data['epg_listings']:
+        try:
+            start = int(ep.get('start_timestamp'))
+        except (TypeError, ValueError):
+            start = parse_xmltv_time_fast(''.join(ch for ch in str(ep.get('start', '')) if ch.isdigit()))
+        try:
+            stop = int(ep.get('stop_timestamp') or ep.get('end_timestamp'))
+        except (TypeError, ValueError):
+            stop = parse_xmltv_time_fast(''.join(ch for ch in str(ep.get('end', '')) if ch.isdigit()))
+        if stop <= start:
+            stop = start + 3600
+        progs.append({'start': start, 'end': stop,
+                      'title': _b64_text(ep.get('title')),
+                      'desc': _b64_text(ep.get('description'))})
+    progs.sort(key=lambda x: x['start'])
+    return progs
+
+def epg_short_lookup(stream_ids, now=None):
+    """{stream_id: (atual, próximo)} pelo get_short_epg, ou None se não suportado."""
+    if now is None:
+        now = int(time.time())
+    cache = epg_short_cache_load()
+    if now - cache.get('unsupported_at', 0) < EPG_TTL:
+        return None
+
+    channels = cache.setdefault('channels', {})
+    missing = []
+    for sid in stream_ids:
+        sid = str(sid)
+        entry = channels.get(sid)
+        fresh = (entry is not None and now - entry.get('fetched_at', 0) < EPG_SHORT_TTL
+                 and (not entry['progs'] or entry['progs'][-1]['end'] > now))
+        if not fresh and sid not in missing:
+            missing.append(sid)
+
+    if missing:
+        started = time.time()
+        fetched = rejected = 0
+        with lazy_import('concurrent.futures').ThreadPoolExecutor(max_workers=EPG_SHORT_WORKERS) as pool:
+            for sid, progs in zip(missing, pool.map(epg_fetch_short, missing)):
+                if progs is False:
+                    rejected += 1
+                elif progs is not None:
+                    fetched += 1
+                    channels[sid] = {'fetched_at': now, 'progs': progs}
+        log(f"EPG curto: {fetched}/{len(missing)} canais em {time.time() - started:.2f}s")
+        if not fetched and rejected:
+            log("Servidor sem get_short_epg, usando XMLTV completo.")
+            cache['unsupported_at'] = now
+            epg_short_cache_save(cache)
+            return None
+        if not fetched and not any(str(sid) in channels for sid in stream_ids):
+            return None
+        epg_short_cache_save(cache)
+
+    result = {}
+    for sid in stream_ids:
+        entry = channels.get(str(sid))
+        if not entry or not entry['progs']:
+            result[sid] = (None, None)
+            continue
+        progs = entry['progs']
+        i_cur, i_next = _epg_pick_current_next([p['start'] for p in progs], [p['end'] for p in progs], now)
+        result[sid] = (progs[i_cur] if i_cur is not None else None,
+                       progs[i_next] if i_next is not None else None)
+    return result
 
 # =========================
 # UI (menus)
 # =========================
-def build_menu(items, mode=None, is_playable=False):
-    if not items:
-        xbmcplugin.endOfDirectory(ADDON_HANDLE)
-        return
+def art_proxy_base():
+    """Prefixo do /art do proxy local, ou None se o cache de imagens não está disponível."""
+    if ART_CACHE != 'true':
+        return None
+    probe = _ART_PROXY_UP
+    now = time.time()
+    if not probe['up'] and (probe['checked'] is None or now - probe['checked'] >= ART_PROXY_RECHECK):
+        probe['checked'] = now
+        try:
+            socket.create_connection(('127.0.0.1', PROXY_PORT), timeout=0.2).close()
+            probe['up'] = True
+        except OSError:
+            probe['up'] = False
+    return f"http://127.0.0.1:{PROXY_PORT}/art?url=" if probe['up'] else None
+
+def art_prefetch(urls):
+    """Pede ao proxy que baixe em segundo plano as imagens da listagem."""
+    body = json.dumps({'urls': urls[:ART_PREFETCH_MAX]}).encode('utf-8')
+    try:
+        sock = socket.create_connection(('127.0.0.1', PROXY_PORT), timeout=0.5)
+        try:
+            sock.sendall(b"POST /artprefetch HTTP/1.1\r\nHost: 127.0.0.1\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: %d\r\n\r\n" % len(body) + body)
+            sock.recv(64)
+        finally:
+            sock.close()
+    except OSError as e:
+        log(f"Pré-carga de imagens não enviada ao proxy: {e}")
+
+def build_menu(items, mode=None, is_playable=False, content=None):
+    """Monta o diretório e entrega todos os itens ao Kodi numa chamada."""
+    started = time.perf_counter()
+    # partes comuns a todos os itens, calculadas uma vez por listagem
+    base_url = sys.argv[0] + '?'
+    play_prefix = base_url + 'mode=play&url='
+    ua_suffix = urllib.parse.quote_plus('|User-Agent=' + USER_AGENT)
+    quote = urllib.parse.quote_plus
+    art_base = art_proxy_base()
+    art_urls = []
+    listing = []
 
     for item in items:
         label = item.get('title', '')
-        li = xbmcgui.ListItem(label=label)
+        li = xbmcgui.ListItem(label=label, offscreen=True)
         icon = item.get('icon', addonIcon)
         if icon:
-            li.setArt({'icon': icon, 'thumb': icon})
+            if art_base and icon.startswith(('http://', 'https://')):
+                # imagens do CDN passam pelo cache do proxy local
+                art_urls.append(icon)
+                art = art_base + quote(icon)
+                li.setArt({'icon': art, 'thumb': art})
+            else:
+                li.setArt({'icon': icon, 'thumb': icon})
         else:
             li.setArt({'icon': addonIcon, 'thumb': addonIcon})
 
         plot = item.get('plot', '') or ''
-        if plot:
-            li.setInfo('video', {'title': label, 'plot': plot})
-        else:
-            li.setInfo('video', {'title': label})
+        set_video_info(li, label, plot)
 
         if 'url' in item and is_playable:
-            play = item['url'] + '|User-Agent=' + USER_AGENT
-            if 'filme:' in label.lower() or 'live' in label.lower():
-                params = {'mode': 'play', 'url': play, 'title': label, 'icon': icon, 'normalplayer': 'true'}
-                url = build_url(**params)
+            play = quote(item['url']) + ua_suffix
+            label_lower = label.lower()
+            if 'filme:' in label_lower or 'live' in label_lower:
+                url = f"{play_prefix}{play}&title={quote(label)}&icon={quote(icon or '')}&normalplayer=true"
             else:
-                li.setProperty('IsPlayable', 'true')                
-                url = build_url(mode='play', url=play)
-            xbmcplugin.addDirectoryItem(ADDON_HANDLE, url, li, False)
+                li.setProperty('IsPlayable', 'true')
+                url = play_prefix + play
+            listing.append((url, li, False))
         else:
-            url_params = {'mode': mode} if mode else {'mode': item.get('mode')}
-            if 'params' in item:
-                qs = urllib.parse.parse_qs(item['params'], keep_blank_values=True)
-                for k, v in qs.items():
-                    url_params[k] = v[0] if isinstance(v, list) else v
-            url = build_url(**url_params)
-            xbmcplugin.addDirectoryItem(ADDON_HANDLE, url, li, item.get('folder', True))
-
+            item_mode = item.get('mode') or mode
+            params = item.get('params')
+            if params and not set(params) - _QS_SAFE_CHARS:
+                # já é uma query string simples (ex.: category_id=3&offset=300)
+                url = f"{base_url}{urllib.parse.urlencode({'mode': item_mode})}&{params}"
+            else:
+                url_params = {'mode': item_mode}
+                if params:
+                    qs = urllib.parse.parse_qs(params, keep_blank_values=True)
+                    for k, v in qs.items():
+                        url_params[k] = v[0] if isinstance(v, list) else v
+                url = base_url + urllib.parse.urlencode(url_params)
+            listing.append((url, li, item.get('folder', True)))
+
+    if listing:
+        xbmcplugin.addDirectoryItems(ADDON_HANDLE, listing, len(listing))
+    if content:
+        xbmcplugin.setContent(ADDON_HANDLE, content)
+        xbmcplugin.addSortMethod(ADDON_HANDLE, xbmcplugin.SORT_METHOD_UNSORTED)
+        xbmcplugin.addSortMethod(ADDON_HANDLE, xbmcplugin.SORT_METHOD_LABEL)
     xbmcplugin.endOfDirectory(ADDON_HANDLE)
+    if art_urls:
+        art_prefetch(art_urls)
+    trace_add('build_menu', started)
+
+def set_video_info(li, title, plot=''):
+    # InfoTagVideo (Kodi 20+); setInfo foi descontinuado, mas é o que o Kodi 19 tem
+    if _INFO_TAG_SETTERS:
+        tag = li.getVideoInfoTag()
+        tag.setTitle(title)
+        if plot:
+            tag.setPlot(plot)
+    elif plot:
+        li.setInfo('video', {'title': title, 'plot': plot})
+    else:
+        li.setInfo('video', {'title': title})
 
 # =========================
 # Funções de dados
@@ -359,16 +1864,39 @@ def get_categories(endpoint):
 def ensure_epg_loaded():
     global _EPG_PARSED
     if _EPG_PARSED is None:
-        _EPG_PARSED = epg_load_parsed()
+        _EPG_PARSED = epg_open_index() or epg_load_parsed()
     return _EPG_PARSED
 
-def annotate_live_with_epg(items_from_api):
-    epg = ensure_epg_loaded()
-    out = []
-    for s in items_from_api:
+def epg_unload():
+    """Descarta o guia carregado; o próximo uso reabre o índice."""
+    global _EPG_PARSED
+    epg, _EPG_PARSED = _EPG_PARSED, None
+    if epg is not None and epg.get('db') is not None:
+        try:
+            epg['db'].close()
+        except sqlite3.Error as e:
+            log(f"Falha ao fechar índice EPG: {e}", xbmc.LOGWARNING)
+
+def annotate_live_with_epg(items_from_api, now=None):
+    """Acrescenta programa atual/próximo ao título e à sinopse dos canais."""
+    started = time.perf_counter()
+    if now is None:
+        now = int(time.time())
+    resolved = None
+    if EPG_MODE == '1':
+        short = epg_short_lookup([s['stream_id'] for s in items_from_api if s.get('stream_id')], now)
+        if short is not None:
+            resolved = [short.get(s.get('stream_id'), (None, None)) for s in items_from_api]
+
+    if resolved is None:
+        epg = ensure_epg_loaded()
+        # resolve a categoria inteira de uma vez, no mesmo instante
+        lookup = epg_lookup_many([s.get('epg_channel_id') for s in items_from_api if s.get('epg_channel_id')], epg, now)
+        resolved = [lookup.get(normalize_epg_channel_id(s.get('epg_channel_id')), (None, None))
+                    if s.get('epg_channel_id') else (None, None) for s in items_from_api]
+
+    for s, (current, nextp) in zip(items_from_api, resolved):
         name = s.get('title') or s.get('name') or 'Sem nome'
-        epg_id = s.get('epg_channel_id')
-        current, nextp = epg_lookup_current_next(epg_id, epg) if epg_id else (None, None)
 
         label = name
         plot = ''
@@ -378,45 +1906,89 @@ def annotate_live_with_epg(items_from_api):
         if nextp:
             plot += f"Próximo: {nextp.get('title', '').strip()}\n{nextp.get('desc', '').strip()}"
 
-        s2 = dict(s)
-        s2['title'] = label
+        s['title'] = label
         if plot.strip():
-            s2['plot'] = plot.strip()
-        out.append(s2)
-    return out
+            s['plot'] = plot.strip()
+    trace_add('annotate_live_with_epg', started)
+    return items_from_api
 
-def get_items(endpoint, category_id=None):
-    params = f"&category_id={category_id}" if category_id else ""
-    data = get_json(f"action={endpoint}{params}")
-    if not data:
-        return []
+def annotate_live_iter(items):
+    """annotate_live_with_epg() em blocos, todos no mesmo instante."""
+    now = int(time.time())
+    items = iter(items)
+    while True:
+        chunk = list(itertools.islice(items, EPG_ANNOTATE_CHUNK))
+        if not chunk:
+            return
+        yield from annotate_live_with_epg(chunk, now)
+
+def get_items(endpoint, category_id=None, offset=0, limit=0):
+    # catálogo local (sincronizado pelo serviço/pesquisa): consulta indexada
+    data = catalog_items(endpoint, category_id, offset, limit)
+    if data is None:
+        params = f"&category_id={category_id}" if category_id else ""
+        data = get_json_iter(f"action={endpoint}{params}")
+        if offset or limit:
+            # itens fora da página são só decodificados, nunca montados; o
+            # resto da resposta é lido por api_drain(), para o cache valer
+            _API_PENDING_STREAMS.append(data)
+            data = itertools.islice(data, offset, offset + limit if limit else None)
+    return stream_items(endpoint, data)
+
+def get_page(endpoint, category_id, mode):
+    """Uma página da categoria, mais o item "Próxima página" se houver mais."""
+    if PAGE_SIZE <= 0:
+        yield from get_items(endpoint, category_id)
+        return
+    try:
+        offset = max(0, int(get_param('offset', '0') or 0))
+    except ValueError:
+        offset = 0
+    # um item a mais só para saber se existe a próxima página
+    items = get_items(endpoint, category_id, offset, PAGE_SIZE + 1)
+    for count, item in enumerate(items):
+        if count == PAGE_SIZE:
+            page = offset // PAGE_SIZE + 2
+            yield {
+                'title': f"Próxima página ({page}) >>",
+                'mode': mode,
+                'params': f"category_id={category_id}&offset={offset + PAGE_SIZE}",
+                'icon': addonIcon,
+            }
+            break
+        yield item
 
-    items = []
+def stream_items(endpoint, data):
+    """Converte itens da API (ou do catálogo) em itens de menu, sob demanda."""
+    items = _stream_items(endpoint, data)
+    if endpoint == 'get_live_streams' and ENABLE_EPG.lower() == 'true':
+        items = annotate_live_iter(items)
+    return items
 
+def _stream_items(endpoint, data):
+    base = api_base()
     if endpoint in ['get_live_streams', 'get_vod_streams']:
         for s in data:
             url = s.get('stream_url', '')
             sid = s.get('stream_id')
             stype = s.get('stream_type', '')
             name = html.unescape(s.get('name', 'Sem nome'))
-            icon = s.get('stream_icon', '')
+            icon = s.get('stream_icon') or ''
             epg_channel_id = s.get('epg_channel_id') or None
 
             if sid:
                 if endpoint == 'get_live_streams':
-                    url = f'{BASE_URL.rstrip("/")}/live/{USERNAME}/{PASSWORD}/{sid}.m3u8'
+                    url = f'{base}/live/{USERNAME}/{PASSWORD}/{sid}.m3u8'
                 else:
                     ext = 'mp4'
-                    url = f'{BASE_URL.rstrip("/")}/{stype}/{USERNAME}/{PASSWORD}/{sid}.{ext}'
+                    url = f'{base}/{stype}/{USERNAME}/{PASSWORD}/{sid}.{ext}'
 
             item = {'title': name, 'url': url, 'icon': icon}
             if epg_channel_id:
                 item['epg_channel_id'] = epg_channel_id
-            items.append(item)
-
-        if endpoint == 'get_live_streams':
-            if ENABLE_EPG.lower() == 'true':
-                items = annotate_live_with_epg(items)
+            if sid and endpoint == 'get_live_streams':
+                item['stream_id'] = sid
+            yield item
 
     elif endpoint == 'get_series':
         for s in data:
@@ -424,60 +1996,131 @@ def get_items(endpoint, category_id=None):
             icon = (s.get('info', {}) or {}).get('cover_big') or (s.get('info', {}) or {}).get('movie_image', '')
             if not icon:
                 icon = s.get('cover') if s.get('cover') else s.get('backdrop_path', [''])[0]
-            items.append({
+            yield {
                 'title': html.unescape(s.get('name', 'Sem nome')),
                 'params': f"series_id={s.get('series_id', '')}",
                 'icon': icon
-            })
+            }
 
-    return items
 
+def series_info_endpoint(series_id):
+    return f"action=get_series_info&series_id={series_id}"
 
-def get_seasons(series_id):
-    data = get_json(f"action=get_series_info&series_id={series_id}")
-    if not data:
-        return []
+def get_series_seasons(series_id):
+    """{temporada: [episódios]} do get_series_info (em cache)."""
+    data = get_json(series_info_endpoint(series_id))
+    seasons = data.get('episodes') if isinstance(data, dict) else None
+    if isinstance(seasons, list):
+        # alguns painéis mandam lista em vez de objeto
+        seasons = {str(i + 1): eps for i, eps in enumerate(seasons)}
+    return seasons if isinstance(seasons, dict) else {}
 
-    seasons = data.get('episodes', {})
+def get_seasons(series_id):
     items = []
-    for season_name, episodes in seasons.items():
-        ep_list = []
-        for index, ep in enumerate(episodes):
-            index += 1
-            title = html.unescape(ep.get('title', 'Sem título'))
-            eid = ep.get('id') or ep.get('episode_id') or ep.get('stream_id')
-            ext = (ep.get('info', {}) or {}).get('container_extension') or 'mp4'
-            icon = (ep.get('info', {}) or {}).get('cover_big') or (ep.get('info', {}) or {}).get('movie_image', '')
-            url = f"{BASE_URL.rstrip('/')}/series/{USERNAME}/{PASSWORD}/{eid}.{ext}" if eid else ep.get('direct_source', '')
-            ep_list.append({'title': str(index) + ' - ' + title, 'url': url, 'icon': icon})
-
-        payload = urllib.parse.quote(json.dumps(ep_list, ensure_ascii=False), safe='')
+    for season_name in get_series_seasons(series_id):
         items.append({
             'title': f"Temporada {season_name}",
-            'params': f"episodes={payload}&series_id={series_id}"
+            'params': f"series_id={series_id}&season={urllib.parse.quote(str(season_name), safe='')}"
         })
     return items
 
+def get_episodes(series_id, season):
+    episodes = get_series_seasons(series_id).get(season) or []
+    base = api_base()
+    ep_list = []
+    for index, ep in enumerate(episodes):
+        index += 1
+        title = html.unescape(ep.get('title', 'Sem título'))
+        eid = ep.get('id') or ep.get('episode_id') or ep.get('stream_id')
+        ext = (ep.get('info', {}) or {}).get('container_extension') or 'mp4'
+        icon = (ep.get('info', {}) or {}).get('cover_big') or (ep.get('info', {}) or {}).get('movie_image', '')
+        url = f"{base}/series/{USERNAME}/{PASSWORD}/{eid}.{ext}" if eid else ep.get('direct_source', '')
+        ep_list.append({'title': str(index) + ' - ' + title, 'url': url, 'icon': icon})
+    return ep_list
+
+def series_prefetch(items):
+    """Baixa para o cache o get_series_info das séries listadas."""
+    endpoints = []
+    for item in items:
+        sid = urllib.parse.parse_qs(item.get('params', '')).get('series_id', [''])[0]
+        if sid and api_cache_load(series_info_endpoint(sid)) is None:
+            endpoints.append(series_info_endpoint(sid))
+        if len(endpoints) >= SERIES_PREFETCH_MAX:
+            break
+    if not endpoints:
+        return
+    started = time.time()
+
+    def fetch(endpoint):
+        try:
+            fetch_json(endpoint)
+            return True
+        except Exception as e:
+            log(f"Pré-carga de série falhou ({endpoint}): {e}")
+            return False
+
+    with lazy_import('concurrent.futures').ThreadPoolExecutor(max_workers=SERIES_PREFETCH_WORKERS) as pool:
+        done = sum(pool.map(fetch, endpoints))
+    log(f"Pré-carga de séries: {done}/{len(endpoints)} em {time.time() - started:.1f}s", xbmc.LOGINFO)
+
+def _search_fetch(endpoint, query):
+    """Itens de um tipo baixado por inteiro cujo nome contém todas as palavras da busca."""
+    started = time.time()
+    tokens = search_fold(query).split()
+    found = []
+    total = 0
+    for s in get_json_iter(f"action={endpoint}"):
+        total += 1
+        if not isinstance(s, dict):
+            continue
+        folded = search_fold(html.unescape(s.get('name') or ''))
+        if tokens and all(t in folded for t in tokens):
+            found.append(s)
+    log(f"Pesquisa: {endpoint} {len(found)}/{total} em {time.time() - started:.2f}s", xbmc.LOGINFO)
+    return found
+
+def _search_items(found):
+    """[(endpoint, item da API)] -> [(endpoint, item de menu)], na mesma ordem."""
+    by_endpoint = {}
+    for endpoint, s in found:
+        by_endpoint.setdefault(endpoint, []).append(s)
+    built = {ep: iter(stream_items(ep, rows)) for ep, rows in by_endpoint.items()}
+    return [(endpoint, next(built[endpoint])) for endpoint, _ in found]
+
 def search_global(query):
+    # índice do catálogo: resultados já ordenados por relevância
+    started = time.time()
+    found, searched = catalog_search(query, [ep for ep, _, _ in SEARCH_SOURCES])
+    if searched:
+        log(f"Pesquisa: catálogo {len(found)} em {time.time() - started:.2f}s", xbmc.LOGINFO)
+    matches = _search_items(found)
+
+    # tipos ainda fora do catálogo: baixados em paralelo e filtrados antes de
+    # virar itens, então o EPG só anota os canais encontrados
+    pending = [ep for ep, _, _ in SEARCH_SOURCES if ep not in searched]
+    if pending:
+        with lazy_import('concurrent.futures').ThreadPoolExecutor(max_workers=min(SEARCH_WORKERS, len(pending))) as pool:
+            fetched = list(pool.map(dialogs_bind(lambda ep: _search_fetch(ep, query)), pending))
+        # o download sincronizou o catálogo: a busca indexada dá a mesma
+        # ordem de relevância da próxima pesquisa
+        synced_found, synced = catalog_search(query, pending)
+        matches.extend(_search_items(synced_found))
+        for endpoint, rows in zip(pending, fetched):
+            if endpoint not in synced:
+                matches.extend((endpoint, i) for i in stream_items(endpoint, rows))
+
+    prefixes = {ep: (prefix, playable) for ep, prefix, playable in SEARCH_SOURCES}
     results = []
-    for endpoint, prefix, playable in [
-        ('get_live_streams', 'Live: ', True),
-        ('get_vod_streams', 'Filme: ', True),
-        ('get_series', 'Série: ', False)
-    ]:
-        items = get_items(endpoint)
-        for i in items:
-            if query.lower() in i['title'].lower():
-                entry = {'title': prefix + i['title'], 'icon': i.get('icon', '')}
-                if playable:
-                    entry['url'] = i['url']
-                    entry['plot'] = i.get('plot', '')
-                else:
-                    entry['mode'] = 'seasons'
-                    entry['params'] = i.get('params', '')
-                results.append(entry)
-    if not results:
-        show_dialog("Aviso", "Nenhum resultado encontrado.")
+    for endpoint, i in matches:
+        prefix, playable = prefixes[endpoint]
+        entry = {'title': prefix + i['title'], 'icon': i.get('icon', '')}
+        if playable:
+            entry['url'] = i['url']
+            entry['plot'] = i.get('plot', '')
+        else:
+            entry['mode'] = 'seasons'
+            entry['params'] = i.get('params', '')
+        results.append(entry)
     return results
 
 def get_account_info():
@@ -555,90 +2198,145 @@ def play_item(url, title, icon, normalplayer):
     else:
         li = xbmcgui.ListItem(label=title, path=url)
         li.setArt({'icon': icon, 'thumb': icon})
-        li.setInfo('video', {'title': title})
+        set_video_info(li, title)
         player = xbmc.Player()
         player.play(item=url, listitem=li)
 
 # =========================
 # Rotas
 # =========================
-PARAMS = get_param_map()
-mode = get_param('mode', 'main')
-log(f"Modo: {mode}")
-
-if mode == 'main':
-    items = [
-        {'title': 'Entrar', 'mode': 'enter'}
-    ]
-    build_menu(items)
-
-elif mode == 'enter':
-    if not BASE_URL or not USERNAME or not PASSWORD:
-        ADDON.openSettings()
-    else:
+PARAMS = {}
+LISTING_MODES = ('tv', 'live_items', 'movies', 'movie_items', 'series', 'series_items',
+                 'seasons', 'episodes', 'search')
+
+def route_listing(mode):
+    """(itens, modo, reproduzível, tipo de conteúdo) de uma rota de listagem."""
+    cid = get_param('category_id')
+    if mode == 'tv':
+        return get_categories('action=get_live_categories'), 'live_items', False, None
+    if mode == 'live_items':
+        return get_page('get_live_streams', cid, mode), None, True, 'videos'
+    if mode == 'movies':
+        return get_categories('action=get_vod_categories'), 'movie_items', False, None
+    if mode == 'movie_items':
+        return get_page('get_vod_streams', cid, mode), None, True, 'movies'
+    if mode == 'series':
+        return get_categories('action=get_series_categories'), 'series_items', False, None
+    if mode == 'series_items':
+        return get_page('get_series', cid, mode), 'seasons', False, 'tvshows'
+    if mode == 'seasons':
+        return get_seasons(get_param('series_id')), 'episodes', False, None
+    if mode == 'episodes':
+        if get_param('episodes'):
+            # URLs antigas (histórico/favoritos) com a lista de episódios embutida
+            eps = json.loads(urllib.parse.unquote(get_param('episodes')))
+        else:
+            eps = get_episodes(get_param('series_id'), get_param('season'))
+        return eps, None, True, 'episodes'
+    if mode == 'search':
+        return search_global(get_param('query')), None, True, 'videos'
+    raise ValueError(f"Modo sem listagem: {mode}")
+
+def backend_listing(mode):
+    """A listagem pedida ao backend do serviço, ou None se ele não estiver disponível."""
+    if SERVICE_BACKEND != 'true':
+        return None
+    started = time.time()
+    reply = backend.request(PROFILE_DIR, {'mode': mode, 'params': PARAMS, 'settings': settings_key(),
+                                           'trace': TRACE == 'true'})
+    if not reply or not reply.get('ok'):
+        if reply:
+            log(f"Backend recusou {mode}: {reply.get('error')}")
+        return None
+    log(f"Backend: {mode} com {len(reply['items'])} itens em {time.time() - started:.2f}s")
+    dialogs_show(reply.get('dialogs') or [])
+    return reply['items'], reply.get('mode'), reply.get('playable', False), reply.get('content')
+
+def router():
+    global PARAMS
+    PARAMS = get_param_map()
+    mode = get_param('mode', 'main')
+    log(f"Modo: {mode}")
+    trace_begin()
+
+    if mode == 'main':
         items = [
-            {'title': 'Informações da Conta', 'mode': 'account_info'},
-            {'title': 'Pesquisa Global', 'mode': 'search'},
-            {'title': 'TV (Canais Ao Vivo)', 'mode': 'tv'},
-            {'title': 'Filmes', 'mode': 'movies'},
-            {'title': 'Séries', 'mode': 'series'},
-            {'title': 'Configurações', 'mode': 'settings'}
+            {'title': 'Entrar', 'mode': 'enter'}
         ]
         build_menu(items)
 
-elif mode == 'account_info':
-    info_text = get_account_info()
-    if info_text:
-        xbmcgui.Dialog().textviewer("Informações da Conta", info_text)
-    else:
-        show_dialog("Erro", "Não foi possível obter informações da conta.")
-
-elif mode == 'settings':
-    ADDON.openSettings()
-
-elif mode == 'tv':
-    build_menu(get_categories('action=get_live_categories'), 'live_items')
+    elif mode == 'enter':
+        if not BASE_URL or not USERNAME or not PASSWORD:
+            ADDON.openSettings()
+        else:
+            items = [
+                {'title': 'Informações da Conta', 'mode': 'account_info'},
+                {'title': 'Pesquisa Global', 'mode': 'search'},
+                {'title': 'TV (Canais Ao Vivo)', 'mode': 'tv'},
+                {'title': 'Filmes', 'mode': 'movies'},
+                {'title': 'Séries', 'mode': 'series'},
+                {'title': 'Configurações', 'mode': 'settings'}
+            ]
+            build_menu(items)
+
+    elif mode == 'account_info':
+        info_text = get_account_info()
+        if info_text:
+            xbmcgui.Dialog().textviewer("Informações da Conta", info_text)
+        else:
+            show_dialog("Erro", "Não foi possível obter informações da conta.")
 
-elif mode == 'live_items':
-    cid = get_param('category_id')
-    build_menu(get_items('get_live_streams', cid), is_playable=True)
+    elif mode == 'settings':
+        ADDON.openSettings()
 
-elif mode == 'movies':
-    build_menu(get_categories('action=get_vod_categories'), 'movie_items')
+    elif mode == 'trace_report':
+        xbmcgui.Dialog().textviewer("Desempenho por tela (p50/p95)",
+                                    perftrace.summarize(perftrace.load(TRACE_PATH)))
+
+    elif mode in LISTING_MODES:
+        if mode == 'search':
+            kb = xbmc.Keyboard('', 'Digite o que deseja buscar')
+            kb.doModal()
+            if not kb.isConfirmed():
+                return
+            PARAMS['query'] = kb.getText()
+        started = time.perf_counter()
+        listing = backend_listing(mode)
+        served = listing is not None
+        startup_mark('backend' if served else 'backend indisponível', started)
+        trace_add('backend' if served else 'backend_indisponivel', started)
+        if not served:
+            started = time.perf_counter()
+            listing = route_listing(mode)
+            startup_mark('rota', started)
+        items, menu_mode, is_playable, content = listing
+        if mode == 'series_items':
+            items = list(items)
+        elif mode == 'search' and not items:
+            show_dialog("Aviso", "Nenhum resultado encontrado.")
+        started = time.perf_counter()
+        build_menu(items, menu_mode, is_playable, content)
+        # listas em gerador (categorias paginadas) são montadas nesta fase
+        startup_mark('menu', started)
+        # com o backend, a pré-carga já roda no serviço
+        if mode == 'series_items' and SERIES_PREFETCH == 'true' and not served:
+            series_prefetch(items)
+
+    elif mode == 'play':
+        url = get_param('url')
+        normalplayer = get_param('normalplayer', 'false')
+        title = get_param('title', 'Reproduzindo')
+        icon = get_param('icon', addonIcon)
+        play_item(url, title, icon, normalplayer)
 
-elif mode == 'movie_items':
-    cid = get_param('category_id')
-    build_menu(get_items('get_vod_streams', cid), is_playable=True)
+    else:
+        show_dialog("Erro", f"Modo desconhecido: {mode}")
 
-elif mode == 'series':
-    build_menu(get_categories('action=get_series_categories'), 'series_items')
+    api_drain()
+    api_refresh_wait()
+    log_http_stats()
+    log_startup_timing()
+    trace_end(mode, _STARTED)
 
-elif mode == 'series_items':
-    cid = get_param('category_id')
-    build_menu(get_items('get_series', cid), 'seasons')
-
-elif mode == 'seasons':
-    sid = get_param('series_id')
-    build_menu(get_seasons(sid), 'episodes')
-
-elif mode == 'episodes':
-    eps_json = urllib.parse.unquote(get_param('episodes', '[]'))
-    eps = json.loads(eps_json)
-    build_menu(eps, is_playable=True)
-
-elif mode == 'search':
-    kb = xbmc.Keyboard('', 'Digite o que deseja buscar')
-    kb.doModal()
-    if kb.isConfirmed():
-        query = kb.getText()
-        build_menu(search_global(query), is_playable=True)
-
-elif mode == 'play':
-    url = get_param('url')
-    normalplayer = get_param('normalplayer', 'false')
-    title = get_param('title', 'Reproduzindo')
-    icon = get_param('icon', addonIcon)
-    play_item(url, title, icon, normalplayer)
-
-else:
-    show_dialog("Erro", f"Modo desconhecido: {mode}")
+if __name__ == '__main__':
+    router()
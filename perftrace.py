@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+"""Trace de desempenho por tela: cada navegação (e cada listagem atendida
+pelo backend do serviço) vira uma linha JSON em trace.jsonl, no perfil, com o
+tempo total e, por span, [chamadas, ms, bytes] (bytes do corpo já
+descomprimido, como o addon o recebe). Os spans podem se sobrepor:
+build_menu consome os geradores da rota, então inclui o corpo HTTP e o EPG
+das listas paginadas. O arquivo é rotativo e guarda as últimas TRACE_KEEP
+linhas.
+
+O relatório (p50/p95 por modo) aparece nas configurações do addon ou, fora
+do Kodi:
+    python perftrace.py caminho/do/perfil/trace.jsonl
+"""
+import argparse
+import json
+import os
+
+TRACE_FILE = 'trace.jsonl'
+TRACE_KEEP = 1000
+TRACE_MAX_BYTES = 1024 * 1024
+
+
+def append(path, entry):
+    """Acrescenta uma linha ao trace, descartando as mais antigas quando o
+    arquivo passa de TRACE_MAX_BYTES. Plugin e serviço escrevem no mesmo
+    arquivo; numa rotação simultânea, no pior caso se perde uma linha."""
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        size = f.tell()
+    if size > TRACE_MAX_BYTES:
+        with open(path, 'r', encoding='utf-8') as f:
+            lines = f.readlines()[-TRACE_KEEP:]
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.writelines(lines)
+        os.replace(tmp_path, path)
+
+
+def load(path):
+    entries = []
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # linha cortada numa rotação
+                if isinstance(entry, dict) and 'mode' in entry:
+                    entries.append(entry)
+    except OSError:
+        pass
+    return entries
+
+
+def percentile(values, pct):
+    """Percentil por posição (nearest-rank) de uma lista não vazia."""
+    values = sorted(values)
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+
+def summarize(entries):
+    """Texto com p50/p95 do tempo total por modo e, abaixo de cada modo, dos
+    spans (ms e bytes) nas navegações em que apareceram."""
+    if not entries:
+        return "Nenhuma navegação registrada. Ative o trace nas configurações e navegue pelo addon."
+    by_mode = {}
+    for entry in entries:
+        key = entry['mode'] if entry.get('source', 'plugin') == 'plugin' else f"{entry['mode']} ({entry['source']})"
+        by_mode.setdefault(key, []).append(entry)
+
+    lines = [f"{'modo / span':<28} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p50 KB':>9}"]
+    for key, rows in sorted(by_mode.items(), key=lambda kv: -len(kv[1])):
+        totals = [r.get('ms', 0) for r in rows]
+        lines.append(f"{key:<28} {len(rows):>5} {percentile(totals, 50):>9.1f} {percentile(totals, 95):>9.1f}")
+        spans = {}
+        for r in rows:
+            for name, (calls, ms, nbytes) in (r.get('spans') or {}).items():
+                spans.setdefault(name, []).append((ms, nbytes))
+        for name, values in sorted(spans.items(), key=lambda kv: -percentile([v[0] for v in kv[1]], 50)):
+            ms = [v[0] for v in values]
+            kb = percentile([v[1] for v in values], 50) / 1024.0
+            line = f"  {name:<26} {len(values):>5} {percentile(ms, 50):>9.1f} {percentile(ms, 95):>9.1f}"
+            lines.append(line + (f" {kb:>9.1f}" if kb else ''))
+    return '\n'.join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Resumo p50/p95 do trace de desempenho por modo.')
+    parser.add_argument('path', help='trace.jsonl no perfil do addon')
+    args = parser.parse_args()
+    print(summarize(load(args.path)))
+
+
+if __name__ == '__main__':
+    main()
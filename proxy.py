@@ -1,6 +1,8 @@
 import json
 import requests
 import binascii
+import collections
+import hashlib
 import os
 import re
 import time
@@ -11,10 +13,11 @@ from urllib.parse import urljoin, unquote_plus, parse_qs, urlparse
 
 import proxy_http_scraper
 try:
-    from kodi_six import xbmc, xbmcaddon
+    from kodi_six import xbmc, xbmcaddon, xbmcvfs
 except ImportError:
     import xbmc
     import xbmcaddon
+    import xbmcvfs
 from dns import customdns
 from requests.exceptions import ConnectionError, RequestException
 try:
@@ -32,6 +35,24 @@ IP_CACHE_MP4 = {}
 AGENT_OF_CHAOS = {}
 COUNT_CLEAR = {}
 SHUTDOWN_EVENT = threading.Event()
+
+# Artwork cache (/art): images on disk in the profile, size-bounded LRU
+ART_CACHE_DIR = os.path.join(xbmcvfs.translatePath(xbmcaddon.Addon().getAddonInfo('profile')), 'art_cache')
+ART_DEFAULT_MB = 200
+ART_MAX_IMAGE = 5 * 1024 * 1024
+ART_TIMEOUT = 10
+ART_PREFETCH_WORKERS = 4
+ART_PREFETCH_MAX_BODY = 2 * 1024 * 1024
+ART_TYPES = {'image/jpeg': '.jpg', 'image/png': '.png', 'image/webp': '.webp', 'image/gif': '.gif'}
+ART_INDEX = collections.OrderedDict()  # key -> (file, bytes), least to most recently used
+ART_INFLIGHT = {}  # key -> Event of in-flight downloads (coalescing)
+ART_QUEUE = collections.deque()  # URLs of the latest listing to prefetch
+ART_LOCK = threading.Lock()
+ART_QUEUE_READY = threading.Condition(ART_LOCK)
+ART_STATE = {'loaded': False, 'bytes': 0, 'max_bytes': 0, 'workers': 0}
+ART_SESSION = requests.Session()
+ART_SESSION.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=32))
+ART_SESSION.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=32))
 customdns(cache_ttl=14400)  # Ativa DNS customizado com cache de 4 horas
 
 # Logging setup
@@ -88,6 +109,19 @@ def rewrite_m3u8_urls(playlist_content, base_url, scheme, host):
             return segment_url
     return re.sub(r'^(?!#)\S+', replace_url, playlist_content, flags=re.MULTILINE)
 
+def cache_chunk(cache_key, url, chunk):
+    """Keep the last 20 chunks of .mp4 or .ts streams; True for TS."""
+    if '.mp4' in url.lower():
+        IP_CACHE_MP4.setdefault(cache_key, []).append(chunk)
+        if len(IP_CACHE_MP4[cache_key]) > 20:
+            IP_CACHE_MP4[cache_key].pop(0)
+    elif '.ts' in url.lower() or '/hl' in url.lower():
+        IP_CACHE_TS.setdefault(cache_key, []).append(chunk)
+        if len(IP_CACHE_TS[cache_key]) > 20:
+            IP_CACHE_TS[cache_key].pop(0)
+        return True
+    return False
+
 def stream_response(response, client_ip, url, headers, sess):
     """Stream response chunks, caching for .mp4 and .ts files."""
     cache_key = get_cache_key(client_ip, url) if any(ext in url.lower() for ext in ['.mp4', '.m3u8']) else client_ip
@@ -99,15 +133,8 @@ def stream_response(response, client_ip, url, headers, sess):
             for chunk in response.iter_content(chunk_size=4096):
                 if chunk:
                     bytes_read += len(chunk)
-                    if '.mp4' in url.lower():
-                        IP_CACHE_MP4.setdefault(cache_key, []).append(chunk)
-                        if len(IP_CACHE_MP4[cache_key]) > 20:
-                            IP_CACHE_MP4[cache_key].pop(0)
-                    elif '.ts' in url.lower() or '/hl' in url.lower():
+                    if cache_chunk(cache_key, url, chunk):
                         mode_ts[0] = True
-                        IP_CACHE_TS.setdefault(cache_key, []).append(chunk)
-                        if len(IP_CACHE_TS[cache_key]) > 20:
-                            IP_CACHE_TS[cache_key].pop(0)
                     yield chunk
         except (IncompleteRead, ConnectionError) as e:
             logging.debug("[HLS Proxy] Error processing chunks (bytes read: %d): %s" % (bytes_read, e))
@@ -145,6 +172,149 @@ def parse_headers(request):
             headers[key] = value
     return headers
 
+def art_key(url):
+    return hashlib.md5(url.encode('utf-8')).hexdigest()
+
+def art_cache_load():
+    """Index the image cache on first call (hold ART_LOCK): LRU order comes
+    from the modification time, which is refreshed on every hit."""
+    if ART_STATE['loaded']:
+        return
+    ART_STATE['loaded'] = True
+    try:
+        mb = int(xbmcaddon.Addon().getSetting('art_cache_mb') or ART_DEFAULT_MB)
+    except ValueError:
+        mb = ART_DEFAULT_MB
+    ART_STATE['max_bytes'] = max(mb, 1) * 1024 * 1024
+    if not os.path.isdir(ART_CACHE_DIR):
+        os.makedirs(ART_CACHE_DIR)
+    entries = []
+    for entry in os.scandir(ART_CACHE_DIR):
+        if entry.is_file() and not entry.name.endswith('.tmp'):
+            st = entry.stat()
+            entries.append((st.st_mtime, entry.name, st.st_size))
+    for _, name, size in sorted(entries):
+        ART_INDEX[name.split('.', 1)[0]] = (name, size)
+        ART_STATE['bytes'] += size
+    art_evict()
+
+def art_evict():
+    while ART_STATE['bytes'] > ART_STATE['max_bytes'] and ART_INDEX:
+        _, (name, size) = ART_INDEX.popitem(last=False)
+        ART_STATE['bytes'] -= size
+        try:
+            os.remove(os.path.join(ART_CACHE_DIR, name))
+        except OSError:
+            pass
+
+def art_lookup(key):
+    """Path and content type of a cached image (hold ART_LOCK), or None."""
+    entry = ART_INDEX.get(key)
+    if entry is None:
+        return None
+    path = os.path.join(ART_CACHE_DIR, entry[0])
+    if not os.path.exists(path):
+        ART_INDEX.pop(key)
+        ART_STATE['bytes'] -= entry[1]
+        return None
+    ART_INDEX.move_to_end(key)
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    ext = os.path.splitext(entry[0])[1]
+    content_type = next((t for t, e in ART_TYPES.items() if e == ext), 'application/octet-stream')
+    return path, content_type
+
+def art_download(url, key):
+    try:
+        response = ART_SESSION.get(url, headers={'User-Agent': DEFAULT_USER_AGENT}, stream=True, timeout=ART_TIMEOUT)
+        try:
+            if response.status_code != 200:
+                logging.debug("[Art] HTTP %d: %s" % (response.status_code, url))
+                return None
+            content_type = response.headers.get('content-type', '').split(';')[0].strip().lower()
+            data = bytearray()
+            for chunk in response.iter_content(chunk_size=65536):
+                data.extend(chunk)
+                if len(data) > ART_MAX_IMAGE:
+                    logging.debug("[Art] Image too large: %s" % url)
+                    return None
+        finally:
+            response.close()
+    except RequestException as e:
+        logging.debug("[Art] Download failed %s: %s" % (url, e))
+        return None
+    if not data:
+        return None
+    name = key + ART_TYPES.get(content_type, '.img')
+    path = os.path.join(ART_CACHE_DIR, name)
+    tmp_path = '%s.%d.tmp' % (path, threading.get_ident())
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    with ART_LOCK:
+        old = ART_INDEX.pop(key, None)
+        if old:
+            ART_STATE['bytes'] -= old[1]
+        ART_INDEX[key] = (name, len(data))
+        ART_STATE['bytes'] += len(data)
+        art_evict()
+        return art_lookup(key)
+
+def art_get(url):
+    """(path, content type) of the image, downloading it if needed. Concurrent
+    requests for the same URL (Kodi and the prefetch) share one download."""
+    key = art_key(url)
+    with ART_LOCK:
+        art_cache_load()
+        cached = art_lookup(key)
+        if cached:
+            return cached
+        event = ART_INFLIGHT.get(key)
+        owner = event is None
+        if owner:
+            event = ART_INFLIGHT[key] = threading.Event()
+    if not owner:
+        event.wait(ART_TIMEOUT * 2)
+        with ART_LOCK:
+            return art_lookup(key)
+    try:
+        return art_download(url, key)
+    finally:
+        with ART_LOCK:
+            ART_INFLIGHT.pop(key, None)
+        event.set()
+
+def art_prefetch_worker():
+    try:
+        while not SHUTDOWN_EVENT.is_set():
+            with ART_QUEUE_READY:
+                while not ART_QUEUE and not SHUTDOWN_EVENT.is_set():
+                    ART_QUEUE_READY.wait(5)
+                if SHUTDOWN_EVENT.is_set():
+                    break
+                url = ART_QUEUE.popleft()
+            try:
+                art_get(url)
+            except Exception as e:
+                logging.debug("[Art] Prefetch error %s: %s" % (url, e))
+    finally:
+        # a restarted proxy spawns its workers again
+        with ART_LOCK:
+            ART_STATE['workers'] -= 1
+
+def art_prefetch(urls):
+    """Replace the prefetch queue with the images of the current listing (the
+    previous one is no longer wanted) and make sure the workers are running."""
+    with ART_QUEUE_READY:
+        ART_QUEUE.clear()
+        ART_QUEUE.extend(u for u in urls if isinstance(u, str) and u.startswith(('http://', 'https://')))
+        while ART_STATE['workers'] < ART_PREFETCH_WORKERS:
+            ART_STATE['workers'] += 1
+            threading.Thread(target=art_prefetch_worker).start()
+        ART_QUEUE_READY.notify_all()
+
 def handle_request(client_socket, client_address, server_socket):
     """Handle incoming HTTP request."""
     try:
@@ -159,7 +329,7 @@ def handle_request(client_socket, client_address, server_socket):
             return
         request_line = lines[0]
         method, path, _ = request_line.split(' ', 2)
-        if method != 'GET':
+        if method != 'GET' and not (method == 'POST' and path == '/artprefetch'):
             client_socket.sendall(b"HTTP/1.1 405 Method Not Allowed\r\n\r\n")
             return
 
@@ -182,7 +352,41 @@ def handle_request(client_socket, client_address, server_socket):
                 response.encode('utf-8')
             )
             SHUTDOWN_EVENT.set()
+            try:
+                server_socket.shutdown(socket.SHUT_RDWR)  # wakes the accept() in run_server
+            except socket.error:
+                pass
             server_socket.close()
+        elif path == "/art":
+            url = query_params.get('url', [None])[0]
+            if not url or not url.startswith(('http://', 'https://')):
+                client_socket.sendall(b"HTTP/1.1 400 Bad Request\r\n\r\nInvalid or missing image URL")
+                return
+            cached = art_get(url)
+            if not cached:
+                client_socket.sendall(b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n")
+                return
+            with open(cached[0], 'rb') as f:
+                data = f.read()
+            client_socket.sendall(
+                ("HTTP/1.1 200 OK\r\nContent-Type: %s\r\nContent-Length: %d\r\n"
+                 "Cache-Control: max-age=86400\r\nConnection: close\r\n\r\n" % (cached[1], len(data))).encode('utf-8') + data
+            )
+        elif path == "/artprefetch":
+            length = min(int(headers.get('Content-Length', '0') or 0), ART_PREFETCH_MAX_BODY)
+            body = request_data.split('\r\n\r\n', 1)[1] if '\r\n\r\n' in request_data else ''
+            while len(body) < length:
+                chunk = client_socket.recv(65536)
+                if not chunk:
+                    break
+                body += chunk.decode('utf-8', errors='ignore')
+            try:
+                urls = json.loads(body).get('urls') or []
+            except (ValueError, AttributeError):
+                client_socket.sendall(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+                return
+            art_prefetch(urls)
+            client_socket.sendall(b"HTTP/1.1 202 Accepted\r\nContent-Length: 0\r\n\r\n")
         elif path == "/hlsretry":
             url = query_params.get('url', [None])[0]
             try:
@@ -529,17 +733,37 @@ def is_proxy_running():
     except socket.error:
         return False
 
+def stop_proxy():
+    """Ask the proxy listening on PORT (either engine) to shut down."""
+    try:
+        s = socket.create_connection(('127.0.0.1', PORT), timeout=1)
+        try:
+            s.sendall(b"GET /stop HTTP/1.1\r\nHost: 127.0.0.1\r\n\r\n")
+            s.recv(1024)
+        finally:
+            s.close()
+    except socket.error:
+        return False
+    # wait for the port so a restart right after can bind it
+    deadline = time.time() + 3
+    while is_proxy_running() and time.time() < deadline:
+        time.sleep(0.1)
+    return True
+
 def start_proxy():
     """Start the proxy server, ensuring only one instance runs."""
     if is_proxy_running():
         xbmc.log("[Proxy] Proxy is already running on port %d" % PORT, level=xbmc.LOGINFO)
         return False
+    SHUTDOWN_EVENT.clear()  # left set by an earlier /stop in this process
 
     server_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
     try:
         server_socket.bind(('127.0.0.1', PORT))
-        server_socket.listen(5)
+        # skins request dozens of posters at once; with a short backlog the
+        # extra connections only get in after the SYN retransmit (1s)
+        server_socket.listen(64)
     except socket.error as e:
         xbmc.log("[Proxy] Failed to bind to port %d: %s" % (PORT, e), level=xbmc.LOGERROR)
         server_socket.close()
@@ -553,6 +777,8 @@ def start_proxy():
                     client_socket, client_address = server_socket.accept()
                     threading.Thread(target=handle_request, args=(client_socket, client_address, server_socket)).start()
                 except socket.error:
+                    if server_socket.fileno() == -1:
+                        break
                     if not SHUTDOWN_EVENT.is_set():
                         logging.error("Error accepting connection")
         except Exception as e:
@@ -567,7 +793,12 @@ def start_proxy():
 
 def kodiproxy():
     """Start the Kodi proxy server."""
-    if start_proxy():
+    if xbmcaddon.Addon().getSetting('proxy_engine') == '1':
+        import proxy_async  # imports this module; only loaded with the asyncio engine
+        started = proxy_async.start_proxy()
+    else:
+        started = start_proxy()
+    if started:
         xbmc.log("[Addon] Proxy started successfully", level=xbmc.LOGINFO)
     else:
         xbmc.log("[Addon] Failed to start proxy (already running)", level=xbmc.LOGERROR)
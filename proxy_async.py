@@ -0,0 +1,686 @@
+# -*- coding: utf-8 -*-
+"""Asyncio engine for the local proxy (proxy_engine setting): the same routes
+as proxy.py (/hlsretry, /mp4proxy, /tsdownloader, /art, /artprefetch, /stop)
+served by a single event loop thread instead of one blocking `requests`
+thread per connection. Downloads use a minimal HTTP/1.1 client on asyncio
+streams (TLS, redirects, chunked, HTTP proxy via CONNECT).
+
+Caches, User-Agent rotation and playlist rewriting come from proxy.py. The
+remaining blocking work (DNS, /art downloads, HTTP proxy list) runs on
+plain threads rather than the default executor, which refuses work once the
+main thread has exited (the plugin's play_item() returns while the proxy
+keeps running)."""
+import asyncio
+import base64
+import binascii
+import json
+import logging
+import os
+import socket
+import ssl
+import threading
+import time
+from urllib.parse import urljoin, urlsplit, unquote_plus, parse_qs, urlparse
+
+try:
+    from kodi_six import xbmc, xbmcaddon
+except ImportError:
+    import xbmc
+    import xbmcaddon
+
+import proxy
+import proxy_http_scraper
+from proxy import (PORT, DEFAULT_USER_AGENT, IP_CACHE_TS, IP_CACHE_MP4, AGENT_OF_CHAOS, COUNT_CLEAR,
+                   SHUTDOWN_EVENT, ART_PREFETCH_MAX_BODY, get_ip, get_cache_key, rewrite_m3u8_urls,
+                   cache_chunk, stream_cache, parse_headers)
+
+HLS_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/127.0.0.0 Safari/537.36'
+CHUNK_SIZE = 4096  # same as iter_content in proxy.py (the cache keeps the last 20)
+MAX_REDIRECTS = 10
+REQUEST_HEAD_TIMEOUT = 5
+RETRY_DELAY = 3
+DNS_TTL = 300  # customdns caches for 4h; this only avoids a thread per connection
+# Kodi headers not forwarded upstream; the response is always requested
+# uncompressed, as requests' iter_content delivers it
+HOP_HEADERS = ('host', 'connection', 'keep-alive', 'proxy-connection', 'accept-encoding',
+               'transfer-encoding', 'te', 'upgrade', 'content-length')
+STATE = {'stop': None, 'running': False}
+_SSL_CONTEXT = []
+_DNS_CACHE = {}  # (host, port) -> (expires, IP)
+
+
+class UpstreamError(Exception):
+    """Network or protocol error from upstream (RequestException in proxy.py)."""
+
+
+class UpstreamResponse(object):
+    """Upstream response whose body is still on the socket."""
+
+    def __init__(self, url, status_code, headers, reader, writer, timeout):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers  # lowercase names
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+
+    async def _read(self, size):
+        try:
+            data = await asyncio.wait_for(self.reader.read(size), self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise UpstreamError("read failed: %s" % e)
+        if not data:
+            raise UpstreamError("connection closed mid-body")
+        return data
+
+    async def iter_content(self, chunk_size=CHUNK_SIZE):
+        """Yield the body in chunks of up to chunk_size bytes."""
+        if self.status_code in (204, 304) or 100 <= self.status_code < 200:
+            return
+        if 'chunked' in self.headers.get('transfer-encoding', '').lower():
+            while True:
+                try:
+                    line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+                    size = int(line.split(b';', 1)[0].strip(), 16)
+                except (OSError, asyncio.TimeoutError, ValueError) as e:
+                    raise UpstreamError("bad chunked body: %s" % e)
+                if size == 0:
+                    break
+                while size:
+                    data = await self._read(min(chunk_size, size))
+                    size -= len(data)
+                    yield data
+                await self._read_line()
+            return
+        length = self.headers.get('content-length')
+        if length is not None and length.strip().isdigit():
+            remaining = int(length)
+            while remaining:
+                data = await self._read(min(chunk_size, remaining))
+                remaining -= len(data)
+                yield data
+            return
+        # no length: read until the server closes
+        while True:
+            try:
+                data = await asyncio.wait_for(self.reader.read(chunk_size), self.timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                raise UpstreamError("read failed: %s" % e)
+            if not data:
+                return
+            yield data
+
+    async def _read_line(self):
+        try:
+            await asyncio.wait_for(self.reader.readline(), self.timeout)
+        except (OSError, asyncio.TimeoutError) as e:
+            raise UpstreamError("read failed: %s" % e)
+
+    async def read(self):
+        body = bytearray()
+        async for chunk in self.iter_content(65536):
+            body.extend(chunk)
+        return bytes(body)
+
+    def close(self):
+        try:
+            self.writer.close()
+        except Exception:
+            pass
+
+
+def _set_future(future, result, error):
+    if future.cancelled():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+def run_blocking(func, *args):
+    """Run func(*args) on its own thread; return a loop future."""
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+
+    def worker():
+        try:
+            result, error = func(*args), None
+        except Exception as e:
+            result, error = None, e
+        try:
+            loop.call_soon_threadsafe(_set_future, future, result, error)
+        except RuntimeError:
+            pass  # loop already closed
+
+    threading.Thread(target=worker).start()
+    return future
+
+
+async def resolve(host, port):
+    """IP to connect to, resolved through customdns (memoized for DNS_TTL)."""
+    cached = _DNS_CACHE.get((host, port))
+    if cached and cached[0] > time.time():
+        return cached[1]
+    infos = await run_blocking(socket.getaddrinfo, host, port, 0, socket.SOCK_STREAM)
+    address = infos[0][4][0]
+    _DNS_CACHE[(host, port)] = (time.time() + DNS_TTL, address)
+    return address
+
+
+def ssl_context():
+    """Same CA bundle as requests (certifi) when available."""
+    if not _SSL_CONTEXT:
+        try:
+            import certifi
+            _SSL_CONTEXT.append(ssl.create_default_context(cafile=certifi.where()))
+        except ImportError:
+            _SSL_CONTEXT.append(ssl.create_default_context())
+    return _SSL_CONTEXT[0]
+
+
+async def open_tunnel(proxy_url, host, port):
+    """TLS connection to host:port through an HTTP proxy (CONNECT)."""
+    loop = asyncio.get_running_loop()
+    proxy_parts = urlsplit(proxy_url)
+    address = await resolve(proxy_parts.hostname, proxy_parts.port or 80)
+    sock = socket.socket(socket.AF_INET6 if ':' in address else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+    try:
+        await loop.sock_connect(sock, (address, proxy_parts.port or 80))
+        await loop.sock_sendall(sock, ("CONNECT %s:%d HTTP/1.1\r\nHost: %s:%d\r\n\r\n" % (host, port, host, port)).encode('utf-8'))
+        head = b''
+        while b'\r\n\r\n' not in head:
+            data = await loop.sock_recv(sock, 4096)
+            if not data or len(head) > 65536:
+                raise UpstreamError("proxy closed the tunnel")
+            head += data
+        status = head.split(b'\r\n', 1)[0].split(b' ')
+        if len(status) < 2 or status[1] != b'200':
+            raise UpstreamError("proxy refused CONNECT: %s" % head.split(b'\r\n', 1)[0].decode('latin-1'))
+        return await asyncio.open_connection(sock=sock, ssl=ssl_context(), server_hostname=host)
+    except BaseException:
+        sock.close()
+        raise
+
+
+async def _request(url, headers, proxy_url):
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in ('http', 'https') or not parts.hostname:
+        raise UpstreamError("unsupported URL: %s" % url)
+    host = parts.hostname
+    port = parts.port or (443 if scheme == 'https' else 80)
+    target = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+
+    if proxy_url and scheme == 'https':
+        reader, writer = await open_tunnel(proxy_url, host, port)
+    elif proxy_url:
+        proxy_parts = urlsplit(proxy_url)
+        reader, writer = await asyncio.open_connection(await resolve(proxy_parts.hostname, proxy_parts.port or 80),
+                                                       proxy_parts.port or 80)
+        target = url.split('#', 1)[0]  # an HTTP proxy gets the absolute URL
+    elif scheme == 'https':
+        reader, writer = await asyncio.open_connection(await resolve(host, port), port, ssl=ssl_context(), server_hostname=host)
+    else:
+        reader, writer = await asyncio.open_connection(await resolve(host, port), port)
+
+    try:
+        lines = ["GET %s HTTP/1.1" % target, "Host: %s" % parts.netloc.rsplit('@', 1)[-1]]
+        if parts.username:
+            auth = "%s:%s" % (unquote_plus(parts.username), unquote_plus(parts.password or ''))
+            lines.append("Authorization: Basic %s" % base64.b64encode(auth.encode('utf-8')).decode('ascii'))
+        for k, v in headers.items():
+            if k.lower() not in HOP_HEADERS:
+                lines.append("%s: %s" % (k, v))
+        lines += ["Accept-Encoding: identity", "Connection: close"]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode('utf-8'))
+
+        head = await reader.readuntil(b'\r\n\r\n')
+        status_line, _, header_block = head.decode('latin-1').partition('\r\n')
+        status_parts = status_line.split(' ', 2)
+        if len(status_parts) < 2 or not status_parts[0].startswith('HTTP/'):
+            raise UpstreamError("bad status line: %r" % status_line)
+        response_headers = {}
+        for line in header_block.split('\r\n'):
+            if ':' in line:
+                key, value = line.split(':', 1)
+                response_headers[key.strip().lower()] = value.strip()
+        return UpstreamResponse(url, int(status_parts[1]), response_headers, reader, writer, None)
+    except BaseException:
+        writer.close()
+        raise
+
+
+async def fetch(url, headers, timeout, proxy_url=None, allow_redirects=True):
+    """Async GET following redirects, like session.get(..., stream=True)."""
+    for _ in range(MAX_REDIRECTS + 1):
+        try:
+            response = await asyncio.wait_for(_request(url, headers, proxy_url), timeout)
+        except UpstreamError:
+            raise
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError) as e:
+            raise UpstreamError("%s: %s" % (url, str(e) or e.__class__.__name__))
+        response.timeout = timeout
+        location = response.headers.get('location')
+        if allow_redirects and response.status_code in (301, 302, 303, 307, 308) and location:
+            response.close()
+            url = urljoin(url, location)
+            continue
+        return response
+    raise UpstreamError("too many redirects: %s" % url)
+
+
+async def http_proxy_selected():
+    """HTTP proxy from the proxy_http setting, or None."""
+    if (xbmcaddon.Addon().getSetting('proxy_http') or 'false') != 'true':
+        return None
+    return await run_blocking(lambda: proxy_http_scraper.ProxyScraper().get_proxy())
+
+
+async def resolve_via_proxy(url, req_headers, proxy_selected):
+    """Final URL after redirects, requested through the HTTP proxy."""
+    try:
+        response = await fetch(url, req_headers, 10, proxy_url=proxy_selected)
+        response.close()
+        return response.url
+    except UpstreamError:
+        return url
+
+
+async def send(writer, data):
+    writer.write(data)
+    await writer.drain()
+
+
+async def stream_response(response, writer, client_ip, url):
+    """Relay the body to Kodi, falling back to cached chunks (see proxy.stream_response)."""
+    cache_key = get_cache_key(client_ip, url) if any(ext in url.lower() for ext in ['.mp4', '.m3u8']) else client_ip
+    mode_ts = False
+    bytes_read = 0
+    try:
+        async for chunk in response.iter_content(CHUNK_SIZE):
+            bytes_read += len(chunk)
+            if cache_chunk(cache_key, url, chunk):
+                mode_ts = True
+            await send(writer, chunk)
+    except UpstreamError as e:
+        logging.debug("[HLS Proxy] Error processing chunks (bytes read: %d): %s" % (bytes_read, e))
+        cache = IP_CACHE_TS if mode_ts else IP_CACHE_MP4
+        for chunk in cache.get(cache_key, [])[-5:]:
+            await send(writer, chunk)
+    finally:
+        response.close()
+
+
+async def send_cached(writer, header_str, client_ip, url):
+    await send(writer, header_str.encode('utf-8'))
+    for chunk in stream_cache(client_ip, url) or []:
+        await send(writer, chunk)
+
+
+def count_success(client_ip, cache_key, include_ts):
+    if client_ip in COUNT_CLEAR and COUNT_CLEAR.get(client_ip, 0) > 4:
+        AGENT_OF_CHAOS.pop(cache_key, None)
+        IP_CACHE_MP4.pop(cache_key, None)
+        if include_ts:
+            IP_CACHE_TS.pop(cache_key, None)
+        COUNT_CLEAR[client_ip] = 0
+    else:
+        COUNT_CLEAR[client_ip] = COUNT_CLEAR.get(client_ip, 0) + 1
+
+
+async def route_hlsretry(writer, query_params, headers, client_address):
+    url = query_params.get('url', [None])[0]
+    try:
+        url = unquote_plus(url)
+    except:
+        pass
+    client_ip = get_ip(headers, client_address)
+    cache_key = get_cache_key(client_ip, url) if url and any(x in url.lower() for x in ['.mp4', '.m3u8']) else client_ip
+
+    if not url:
+        await send(writer, b"HTTP/1.1 400 Bad Request\r\n\r\nNo URL provided")
+        return
+
+    req_headers = dict((k, v) for k, v in headers.items() if k.lower() != 'host')
+    req_headers.update({'User-Agent': HLS_USER_AGENT})
+    timeout = 15
+    proxy_selected = await http_proxy_selected()
+    if proxy_selected:
+        url = await resolve_via_proxy(url, req_headers, proxy_selected)
+
+    original_headers = req_headers.copy()
+    max_retries = 7
+    attempts = 0
+    tried_without_range = False
+    change_user_agent = False
+    media_type = (
+        'video/mp4' if '.mp4' in url.lower()
+        else 'video/mp2t' if '.ts' in url.lower() or '/hl' in url.lower()
+        else 'application/octet-stream'
+    )
+    response_headers = {}
+    status = 200
+
+    while attempts < max_retries:
+        is_segment = '.ts' in url.lower() or '/hl' in url.lower()
+        try:
+            range_header = req_headers.get('Range')
+            if '.mp4' in url.lower() and range_header and tried_without_range:
+                req_headers.pop('Range', None)
+
+            if AGENT_OF_CHAOS.get(cache_key) and not is_segment:
+                req_headers['User-Agent'] = AGENT_OF_CHAOS[cache_key] if change_user_agent else original_headers.get('User-Agent', DEFAULT_USER_AGENT)
+            elif is_segment:
+                req_headers['User-Agent'] = binascii.b2a_hex(os.urandom(20))[:32] if change_user_agent or not req_headers.get('User-Agent') else original_headers.get('User-Agent', DEFAULT_USER_AGENT)
+
+            response = await fetch(url, req_headers, timeout)
+            logging.debug("HLS PROXY: URL %s, attempt %s, status code %s" % (url, attempts, response.status_code))
+
+            if response.status_code in (200, 206):
+                if '.mp4' in url.lower() or '.m3u8' in url.lower():
+                    url = response.url
+                change_user_agent = False
+                count_success(client_ip, cache_key, True)
+
+                content_type = response.headers.get("content-type", "").lower()
+                if "mpegurl" in content_type or ".m3u8" in url.lower():
+                    base_url = url.rsplit('/', 1)[0]
+                    try:
+                        playlist_content = (await response.read()).decode('utf-8', errors='ignore')
+                    finally:
+                        response.close()
+                    rewritten = rewrite_m3u8_urls(playlist_content, base_url, 'http', '127.0.0.1:%d' % PORT)
+                    await send(writer, b"HTTP/1.1 200 OK\r\nContent-Type: application/x-mpegURL\r\n\r\n" +
+                               rewritten.encode('utf-8'))
+                    return
+
+                media_type = (
+                    'video/mp4' if '.mp4' in url.lower()
+                    else 'video/mp2t' if '.ts' in url.lower() or '/hl' in url.lower()
+                    else response.headers.get("content-type", "application/octet-stream")
+                )
+                response_headers = dict((k.title(), v) for k, v in response.headers.items()
+                                        if k in ['content-type', 'accept-ranges', 'content-range'])
+                status = 206 if response.status_code == 206 else 200
+
+                header_str = "HTTP/1.1 %d OK\r\n" % status
+                for k, v in response_headers.items():
+                    header_str += "%s: %s\r\n" % (k, v)
+                header_str += "Content-Type: %s\r\n\r\n" % media_type
+                await send(writer, header_str.encode('utf-8'))
+                await stream_response(response, writer, client_ip, url)
+                return
+
+            response.close()
+            if response.status_code == 416 and range_header and not tried_without_range:
+                tried_without_range = True
+                continue
+            logging.debug("Error code %d, attempt %d" % (response.status_code, attempts))
+        except UpstreamError as e:
+            logging.debug("Unknown error: %s" % e)
+        change_user_agent = True
+        AGENT_OF_CHAOS[cache_key] = binascii.b2a_hex(os.urandom(20))[:32]
+        await asyncio.sleep(RETRY_DELAY)
+        attempts += 1
+        if '.ts' in url.lower() or '/hl' in url.lower() or '.mp4' in url.lower():
+            header_str = "HTTP/1.1 %d OK\r\nContent-Type: %s\r\n" % (status, media_type)
+            for k, v in response_headers.items():
+                header_str += "%s: %s\r\n" % (k, v)
+            await send_cached(writer, header_str + "\r\n", client_ip, url)
+            return
+
+    await send(writer, b"HTTP/1.1 502 Bad Gateway\r\n\r\nFailed to connect after multiple attempts")
+
+
+async def route_mp4proxy(writer, query_params, headers, client_address):
+    url = query_params.get('url', [None])[0]
+    try:
+        url = unquote_plus(url)
+    except:
+        pass
+    client_ip = get_ip(headers, client_address)
+    cache_key = get_cache_key(client_ip, url)
+
+    if not url or '.mp4' not in url.lower():
+        await send(writer, b"HTTP/1.1 400 Bad Request\r\n\r\nInvalid or missing MP4 URL")
+        return
+
+    req_headers = dict((k, v) for k, v in headers.items() if k.lower() != 'host')
+    req_headers.update({'User-Agent': DEFAULT_USER_AGENT})
+    timeout = 20
+    proxy_selected = await http_proxy_selected()
+    if proxy_selected:
+        url = await resolve_via_proxy(url, req_headers, proxy_selected)
+
+    max_retries = 7
+    attempts = 0
+    tried_without_range = False
+    change_user_agent = False
+    media_type = 'video/mp4'
+    status = 200
+
+    while attempts < max_retries:
+        try:
+            range_header = req_headers.get('Range')
+            if range_header and tried_without_range:
+                req_headers.pop('Range', None)
+
+            if AGENT_OF_CHAOS.get(cache_key):
+                req_headers['User-Agent'] = AGENT_OF_CHAOS[cache_key] if change_user_agent else req_headers.get('User-Agent', DEFAULT_USER_AGENT)
+
+            response = await fetch(url, req_headers, timeout, proxy_url=proxy_selected)
+            logging.debug("MP4 PROXY: URL %s, attempt %s, status code %s" % (url, attempts, response.status_code))
+
+            if response.status_code in (200, 206):
+                url = response.url
+                change_user_agent = False
+                count_success(client_ip, cache_key, False)
+
+                response_headers = dict((k.title(), v) for k, v in response.headers.items()
+                                        if k in ['content-type', 'accept-ranges', 'content-range', 'content-length'])
+                status = 206 if response.status_code == 206 else 200
+
+                header_str = "HTTP/1.1 %d OK\r\n" % status
+                for k, v in response_headers.items():
+                    header_str += "%s: %s\r\n" % (k, v)
+                if 'Content-Type' not in response_headers:
+                    header_str += "Content-Type: %s\r\n" % media_type
+                header_str += "Accept-Ranges: bytes\r\n\r\n"
+                await send(writer, header_str.encode('utf-8'))
+                await stream_response(response, writer, client_ip, url)
+                return
+
+            response.close()
+            if response.status_code == 416 and range_header and not tried_without_range:
+                tried_without_range = True
+                continue
+            logging.debug("MP4 PROXY: Error code %d, attempt %d" % (response.status_code, attempts))
+        except UpstreamError as e:
+            logging.debug("MP4 PROXY: Unknown error: %s" % e)
+        change_user_agent = True
+        AGENT_OF_CHAOS[cache_key] = binascii.b2a_hex(os.urandom(20))[:32]
+        await asyncio.sleep(RETRY_DELAY)
+        attempts += 1
+        await send_cached(writer, "HTTP/1.1 %d OK\r\nContent-Type: %s\r\n\r\n" % (status, media_type), client_ip, url)
+        return
+
+    await send(writer, b"HTTP/1.1 502 Bad Gateway\r\n\r\nFailed to connect after multiple attempts")
+
+
+async def route_tsdownloader(writer, query_params, headers):
+    url = query_params.get('url', [None])[0]
+    if not url:
+        await send(writer, b"HTTP/1.1 400 Bad Request\r\n\r\nMissing 'url' parameter")
+        return
+    try:
+        url = unquote_plus(url)
+    except:
+        pass
+
+    req_headers = dict((k, v) for k, v in headers.items() if k.lower() != 'host')
+    req_headers.update({'User-Agent': HLS_USER_AGENT})
+    last_url = ''
+    proxy_selected = await http_proxy_selected()
+    if proxy_selected:
+        url = last_url = await resolve_via_proxy(url, req_headers, proxy_selected)
+
+    await send(writer, b"HTTP/1.1 200 OK\r\nContent-Type: video/mp2t\r\n\r\n")
+    try:
+        while not SHUTDOWN_EVENT.is_set():
+            try:
+                if not last_url:
+                    response = await fetch(url, req_headers, 7)
+                    response.close()
+                    last_url = response.url
+
+                response = await fetch(last_url, req_headers, 15)
+                try:
+                    if response.status_code == 200:
+                        async for chunk in response.iter_content(CHUNK_SIZE):
+                            if SHUTDOWN_EVENT.is_set():
+                                logging.warning("[TS Downloader] Stream stopped by client or shutdown.")
+                                return
+                            await send(writer, chunk)
+                    else:
+                        logging.warning("[TS Downloader] HTTP response %d" % response.status_code)
+                finally:
+                    response.close()
+            except UpstreamError as e:
+                logging.warning("[TS Downloader] Stream error: %s" % e)
+    except OSError:
+        logging.warning("[TS Downloader] Client disconnected")
+        return
+    logging.warning("[TS Downloader] Stream terminated by client or shutdown")
+
+
+async def handle_client(reader, writer):
+    """Async version of proxy.handle_request."""
+    client_address = writer.get_extra_info('peername') or ('127.0.0.1', 0)
+    try:
+        try:
+            head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), REQUEST_HEAD_TIMEOUT)
+        except asyncio.IncompleteReadError as e:
+            head = e.partial
+        request_data = head.decode('utf-8', errors='ignore')
+        if not request_data:
+            return
+
+        lines = request_data.splitlines()
+        if not lines:
+            return
+        method, path, _ = lines[0].split(' ', 2)
+        if method != 'GET' and not (method == 'POST' and path == '/artprefetch'):
+            await send(writer, b"HTTP/1.1 405 Method Not Allowed\r\n\r\n")
+            return
+
+        headers = parse_headers(request_data)
+        parsed = urlparse(urljoin('http://localhost' + path, path))
+        query_params = parse_qs(parsed.query)
+        path = parsed.path
+
+        if path == "/":
+            await send(writer, b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n" +
+                       json.dumps({"message": "ONEPLAY PROXY"}).encode('utf-8'))
+        elif path == "/stop":
+            await send(writer, b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n\r\n" +
+                       json.dumps({"message": "Proxy shutting down"}).encode('utf-8'))
+            SHUTDOWN_EVENT.set()
+            STATE['stop'].set()
+        elif path == "/art":
+            url = query_params.get('url', [None])[0]
+            if not url or not url.startswith(('http://', 'https://')):
+                await send(writer, b"HTTP/1.1 400 Bad Request\r\n\r\nInvalid or missing image URL")
+                return
+            cached = await run_blocking(proxy.art_get, url)
+            if not cached:
+                await send(writer, b"HTTP/1.1 502 Bad Gateway\r\nContent-Length: 0\r\n\r\n")
+                return
+            with open(cached[0], 'rb') as f:
+                data = f.read()
+            await send(writer, ("HTTP/1.1 200 OK\r\nContent-Type: %s\r\nContent-Length: %d\r\n"
+                                "Cache-Control: max-age=86400\r\nConnection: close\r\n\r\n" % (cached[1], len(data))).encode('utf-8') + data)
+        elif path == "/artprefetch":
+            length = min(int(headers.get('Content-Length', '0') or 0), ART_PREFETCH_MAX_BODY)
+            try:
+                body = await asyncio.wait_for(reader.readexactly(length), REQUEST_HEAD_TIMEOUT)
+            except asyncio.IncompleteReadError as e:
+                body = e.partial
+            try:
+                urls = json.loads(body.decode('utf-8', errors='ignore')).get('urls') or []
+            except (ValueError, AttributeError):
+                await send(writer, b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+                return
+            proxy.art_prefetch(urls)
+            await send(writer, b"HTTP/1.1 202 Accepted\r\nContent-Length: 0\r\n\r\n")
+        elif path == "/hlsretry":
+            await route_hlsretry(writer, query_params, headers, client_address)
+        elif path == "/mp4proxy":
+            await route_mp4proxy(writer, query_params, headers, client_address)
+        elif path == "/tsdownloader":
+            await route_tsdownloader(writer, query_params, headers)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logging.error("Error handling request: %s" % e)
+    finally:
+        writer.close()
+
+
+async def serve(started):
+    """Serve until /stop or Kodi shutdown (SHUTDOWN_EVENT)."""
+    try:
+        server = await asyncio.start_server(handle_client, '127.0.0.1', PORT, backlog=64, reuse_address=True)
+    except OSError as e:
+        xbmc.log("[Proxy] Failed to bind to port %d: %s" % (PORT, e), level=xbmc.LOGERROR)
+        started.set()
+        return
+    STATE['stop'] = asyncio.Event()
+    STATE['running'] = True
+    started.set()
+    xbmc.log("[Proxy] Starting asyncio proxy server on port %d" % PORT, level=xbmc.LOGINFO)
+    try:
+        while not SHUTDOWN_EVENT.is_set():
+            try:
+                await asyncio.wait_for(STATE['stop'].wait(), 1)
+            except asyncio.TimeoutError:
+                pass
+    finally:
+        server.close()
+        pending = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        await server.wait_closed()
+        STATE['running'] = False
+
+
+def start_proxy():
+    """Start the asyncio proxy server, ensuring only one instance runs."""
+    if proxy.is_proxy_running():
+        xbmc.log("[Proxy] Proxy is already running on port %d" % PORT, level=xbmc.LOGINFO)
+        return False
+
+    SHUTDOWN_EVENT.clear()  # left set by an earlier /stop in this process
+    started = threading.Event()
+    STATE['running'] = False
+
+    def run_server():
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        try:
+            loop.run_until_complete(serve(started))
+        except Exception as e:
+            xbmc.log("[Proxy] Server error: %s" % e, level=xbmc.LOGERROR)
+        finally:
+            started.set()
+            loop.close()
+            xbmc.log("[Proxy] Proxy server stopped", level=xbmc.LOGINFO)
+
+    threading.Thread(target=run_server).start()
+    started.wait(10)
+    if not STATE['running']:
+        return False
+    threading.Thread(target=proxy.monitor_kodi_shutdown, args=(None,)).start()
+    return True
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+"""Serviço de segundo plano: mantém aquecidos, no perfil do addon, o EPG e as
+listas de categorias/streams, para que as rotas do plugin leiam dados locais
+e nunca esperem a renovação de 24h do EPG. Também roda o backend residente,
+que responde as listagens do plugin com catálogo, índice do EPG e conexões
+HTTP já carregados neste processo."""
+import json
+import os
+import threading
+import time
+
+import xbmc
+
+import backend
+import main
+
+SERVICE_INTERVAL = 3600  # 1h entre atualizações
+SERVICE_STARTUP_DELAY = 30  # deixa o Kodi terminar de iniciar
+SERVICE_IDLE_SECONDS = 30  # só atualiza com o usuário parado há 30s
+SERVICE_TICK = 60
+
+PREWARM_ACTIONS = (
+    'get_live_categories',
+    'get_vod_categories',
+    'get_series_categories',
+    'get_live_streams',
+    'get_vod_streams',
+    'get_series',
+)
+
+
+class ServiceMonitor(xbmc.Monitor):
+    def __init__(self):
+        super(ServiceMonitor, self).__init__()
+        self.settings_changed = False
+
+    def onSettingsChanged(self):
+        self.settings_changed = True
+
+
+def write_status(last_run):
+    try:
+        main.ensure_profile_dir()
+        tmp_path = main.SERVICE_STATUS_PATH + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'heartbeat': time.time(), 'last_run': last_run}, f)
+        os.replace(tmp_path, main.SERVICE_STATUS_PATH)
+    except Exception as e:
+        main.log(f"Serviço: falha ao gravar status: {e}", xbmc.LOGERROR)
+
+
+def prewarm(monitor):
+    if not all([main.BASE_URL, main.USERNAME, main.PASSWORD]):
+        return
+    started = time.time()
+    for action in PREWARM_ACTIONS:
+        if monitor.abortRequested():
+            return
+        try:
+            main.api_refresh(f"action={action}")
+        except Exception as e:
+            main.log(f"Serviço: falha ao atualizar {action}: {e}", xbmc.LOGERROR)
+
+    if main.ENABLE_EPG.lower() == 'true' and main.EPG_MODE == '0' and not monitor.abortRequested():
+        if main.epg_should_refresh(defer_to_service=False):
+            try:
+                main.epg_download()
+            except Exception as e:
+                main.log(f"Serviço: falha ao baixar EPG: {e}", xbmc.LOGERROR)
+    main.log(f"Serviço: caches atualizados em {time.time() - started:.1f}s", xbmc.LOGINFO)
+    main.log_http_stats()
+
+
+_BACKEND_EPG_MTIME = None
+
+
+def backend_handle(request):
+    """Executa uma rota de listagem do plugin (ver main.route_listing)."""
+    global _BACKEND_EPG_MTIME
+    if request.get('settings') != main.settings_key():
+        # o plugin já vê configurações que o laço do serviço ainda não leu
+        main.load_settings()
+        main.http_session_reset()
+        if request.get('settings') != main.settings_key():
+            return {'ok': False, 'error': 'configurações diferentes'}
+    mode = request.get('mode')
+    if mode not in main.LISTING_MODES:
+        return {'ok': False, 'error': f"modo desconhecido: {mode}"}
+
+    # o serviço trocou o índice do EPG: reabre no próximo uso
+    try:
+        mtime = os.path.getmtime(main.EPG_DB_PATH)
+    except OSError:
+        mtime = None
+    if mtime != _BACKEND_EPG_MTIME:
+        _BACKEND_EPG_MTIME = mtime
+        main.epg_unload()
+
+    started = time.perf_counter()
+    main.trace_begin(bool(request.get('trace')))
+    main.PARAMS = dict(request.get('params') or {})
+    main.dialogs_capture()
+    try:
+        items, menu_mode, is_playable, content = main.route_listing(mode)
+        items = list(items)
+    finally:
+        dialogs = main.dialogs_release()
+    main.trace_end(mode, started, 'backend')
+    main.log(f"Backend: {mode} com {len(items)} itens em {time.perf_counter() - started:.2f}s", xbmc.LOGINFO)
+    if mode == 'series_items' and main.SERIES_PREFETCH == 'true':
+        threading.Thread(target=main.series_prefetch, args=(items,)).start()
+    # o resto da categoria paginada vai para o cache depois da resposta
+    main.api_drain(background=True)
+    return {'ok': True, 'items': items, 'mode': menu_mode, 'playable': is_playable, 'content': content,
+            'dialogs': dialogs}
+
+
+def backend_toggle(stop_event):
+    """Liga/desliga o backend conforme a configuração; devolve o Event atual."""
+    if main.SERVICE_BACKEND == 'true' and stop_event is None:
+        try:
+            main.ensure_profile_dir()
+            return backend.start(main.PROFILE_DIR, backend_handle, main.log)
+        except OSError as e:
+            main.log(f"Serviço: falha ao iniciar o backend: {e}", xbmc.LOGERROR)
+    elif main.SERVICE_BACKEND != 'true' and stop_event is not None:
+        stop_event.set()
+        return None
+    return stop_event
+
+
+def art_proxy_toggle(running):
+    """Liga/desliga o proxy do cache de capas conforme a configuração; devolve
+    se ele está no ar por conta deste serviço."""
+    if main.ART_CACHE == 'true' and not running:
+        # o /art do proxy precisa estar no ar antes das listagens
+        import proxy
+        proxy.kodiproxy()
+        return True
+    if main.ART_CACHE != 'true' and running:
+        if xbmc.Player().isPlaying():
+            return True  # a reprodução passa pelo proxy; derruba num tick seguinte
+        import proxy
+        proxy.stop_proxy()
+        return False
+    return running
+
+
+def run():
+    monitor = ServiceMonitor()
+    last_run = 0
+    next_run = time.time() + SERVICE_STARTUP_DELAY
+    main.log("Serviço iniciado", xbmc.LOGINFO)
+    backend_stop = backend_toggle(None)
+    art_proxy = art_proxy_toggle(False)
+
+    while not monitor.abortRequested():
+        write_status(last_run)
+        if monitor.settings_changed:
+            monitor.settings_changed = False
+            main.load_settings()
+            main.http_session_reset()
+            backend_stop = backend_toggle(backend_stop)
+            # credenciais/EPG podem ter mudado: atualiza na próxima folga
+            next_run = min(next_run, time.time())
+
+        art_proxy = art_proxy_toggle(art_proxy)
+
+        # ranking dos espelhos: renovado aqui para o plugin nunca esperar a medição
+        if main.BASE_URL and main.mirror_stale():
+            main.mirror_probe()
+
+        due = main.SERVICE_PREWARM == 'true' and time.time() >= next_run
+        if due and not xbmc.Player().isPlaying() and xbmc.getGlobalIdleTime() >= SERVICE_IDLE_SECONDS:
+            prewarm(monitor)
+            last_run = time.time()
+            next_run = last_run + SERVICE_INTERVAL
+
+        if monitor.waitForAbort(SERVICE_TICK):
+            break
+    if backend_stop is not None:
+        backend_stop.set()
+    main.log("Serviço finalizado", xbmc.LOGINFO)
+
+
+if __name__ == '__main__':
+    run()